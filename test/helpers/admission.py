@@ -0,0 +1,129 @@
+'''
+    Admission checks of incoming transfers against the coin state.
+
+    `python -m helpers.admission`, run from test/, prints the throughput of the
+    checks.
+'''
+import os
+import random
+import time
+
+import numpy as np
+
+from helpers.coin_state import NOT_EXITING, CoinStateIndex
+from helpers.throughput import Throughput
+
+# reason codes, a transfer gets the first one that applies, DUPLICATE_SLOT
+# only goes to the valid transfers of a slot after the first one
+ACCEPTED = 0
+UNKNOWN_SLOT = 1
+DUPLICATE_SLOT = 2
+PREV_BLOCK_MISMATCH = 3
+DENOMINATION_MISMATCH = 4
+NOT_OWNER = 5
+NOT_TRANSFERABLE = 6
+
+REASONS = {
+    ACCEPTED: 'accepted',
+    UNKNOWN_SLOT: 'unknown slot',
+    DUPLICATE_SLOT: 'slot transferred twice in the batch',
+    PREV_BLOCK_MISMATCH: 'prevBlock is not the last block of the coin',
+    DENOMINATION_MISMATCH: 'denomination is not the deposited one',
+    NOT_OWNER: 'not signed by the owner of the coin',
+    NOT_TRANSFERABLE: 'coin is exiting, exited or withdrawn',
+}
+
+
+def _table_ids(rows, table):
+    """ Position in `table` of every row of a (n, width) byte matrix, -1 when absent"""
+    # rows compared as single opaque values are much faster to sort than per column
+    rows = np.ascontiguousarray(rows)
+    keys = rows.view(np.dtype((np.void, rows.shape[1]))).reshape(-1)
+    unique, inverse = np.unique(keys, return_inverse=True)
+    ids = np.array([table.get(key.tobytes(), -1) for key in unique], dtype=np.int64)
+    return ids[inverse.reshape(-1)]
+
+
+class AdmissionValidator(object):
+    """
+    Checks transfers before they enter the mempool: the slot is a known coin
+    that is not exiting, `prevBlock` is the block the coin was last included
+    in, the denomination is the deposited one and the transfer is signed by
+    the coin's owner.
+
+    Checks are a handful of array operations over a `TransactionBatch` and
+    one hash table lookup per transfer in the `CoinStateIndex`. Signers are
+    recovered by `verifier`, a `SignatureVerifier`, unless given.
+    """
+
+    def __init__(self, index, verifier=None):
+        self.index = index
+        self.verifier = verifier
+
+    def validate(self, batch, signers=None):
+        """
+        Reason code of every transfer of `batch`, ACCEPTED for the ones that
+        can enter the mempool, and the `Throughput`.
+        """
+        started = time.perf_counter()
+        if signers is None:
+            if self.verifier is None:
+                raise ValueError('signers must be given to a validator without a verifier')
+            signers = self.verifier.recover_many(zip(batch.hashes(), batch.signatures()))
+        txs = batch.records
+        index = self.index
+        rows = index.find(txs['slot'])
+        coins = index.records[np.maximum(rows, 0)]
+
+        # few distinct signers, each address string is converted once
+        signer_ids = {}
+        for signer in signers:
+            if signer not in signer_ids:
+                signer_ids[signer] = index.owner_ids.get(bytes.fromhex(signer[2:]), -1)
+        signer_ids = np.array([signer_ids[signer] for signer in signers], dtype=np.int64)
+        denomination_ids = {
+            denomination.to_bytes(32, byteorder='big'): denomination_id
+            for denomination, denomination_id in index.denomination_ids.items()
+        }
+        denominations = _table_ids(txs['denomination'], denomination_ids)
+
+        # the most important reasons are written last so they win
+        reasons = np.zeros(len(txs), dtype=np.uint8)
+        reasons[signer_ids != coins['owner']] = NOT_OWNER
+        reasons[denominations != coins['denomination']] = DENOMINATION_MISMATCH
+        reasons[txs['prev_block'] != coins['last_block']] = PREV_BLOCK_MISMATCH
+        reasons[coins['state'] != NOT_EXITING] = NOT_TRANSFERABLE
+        reasons[rows < 0] = UNKNOWN_SLOT
+
+        # only valid transfers take the slot, so an invalid transfer ahead of
+        # the owner's one doesn't get it rejected
+        valid = np.flatnonzero(reasons == ACCEPTED)
+        _, first = np.unique(txs['slot'][valid], return_index=True)
+        duplicate = np.ones(len(valid), dtype=bool)
+        duplicate[first] = False
+        reasons[valid[duplicate]] = DUPLICATE_SLOT
+        return reasons, Throughput(len(reasons), time.perf_counter() - started)
+
+
+def benchmark(coins=1_000_000, transfers=100_000):
+    """ Throughput of `AdmissionValidator.validate` with `transfers` out of `coins`"""
+    from helpers.transaction import PlasmaTransaction
+    from helpers.tx_batch import TransactionBatch
+
+    owners = ['0x' + os.urandom(20).hex() for _ in range(1_000)]
+    slots = np.unique(np.random.randint(0, 2 ** 63, size=coins, dtype=np.int64).astype(np.uint64))
+    coin_owners = [random.choice(owners) for _ in range(len(slots))]
+    index = CoinStateIndex(len(slots))
+    index.upsert(slots, coin_owners, [1_000] * len(slots), [5_000 * 10 ** 18] * len(slots))
+
+    picked = random.sample(range(len(slots)), transfers)
+    batch = TransactionBatch.from_transactions(
+        PlasmaTransaction(int(slots[i]), 1_000, 5_000 * 10 ** 18, random.choice(owners)) for i in picked
+    )
+    signers = [coin_owners[i] for i in picked]
+    return AdmissionValidator(index).validate(batch, signers)
+
+
+if __name__ == '__main__':
+    reasons, throughput = benchmark()
+    print(throughput, '{} accepted'.format(int((reasons == ACCEPTED).sum())))
@@ -0,0 +1,122 @@
+import time
+from collections import namedtuple
+
+from helpers.sparse_merkle_tree import SparseMerkleTree
+from helpers.throughput import Throughput
+
+# `PlasmaContract.childBlockInterval`, operator blocks are its multiples
+CHILD_BLOCK_INTERVAL = 1000
+
+# below this many transfers starting a process pool costs more than it saves
+PARALLEL_SEAL_MIN = 4096
+
+
+class SealedBlock(namedtuple('SealedBlock', ['number', 'root', 'tree', 'proofs', 'transfers', 'throughput'])):
+    """
+    A block sealed by `BlockBuilder.seal`: its merkle tree of transaction
+    hashes keyed by slot, the proofs of every slot, the slot -> (tx, signature)
+    transfers and the `Throughput` of the seal.
+    """
+    __slots__ = ()
+
+
+class Mempool(object):
+    """
+    Transfers waiting for the next block, keyed by slot.
+
+    A block carries at most one transfer per slot, a second transfer of a
+    slot waits for the transfer already pooled to be sealed. A transaction
+    hash is accepted once per block: the hashes are forgotten when the pool
+    is drained, a sealed transfer sent again fails the prevBlock check of
+    admission anyway.
+    """
+
+    def __init__(self):
+        self.transfers = {}
+        self.seen = set()
+
+    def add(self, tx, signature=None):
+        """ Pools the `PlasmaTransaction` `tx` and its signature"""
+        if tx.hash in self.seen:
+            raise self.DuplicateTransactionException('transaction {} was already submitted'.format(tx.hash.hex()))
+        if tx.slot in self.transfers:
+            raise self.SlotTakenException('slot {} already has a transfer in this block'.format(tx.slot))
+        self.transfers[tx.slot] = (tx, signature)
+        self.seen.add(tx.hash)
+
+    def drain(self):
+        """ Returns the pooled transfers and empties the pool"""
+        transfers = self.transfers
+        self.transfers = {}
+        self.seen = set()
+        return transfers
+
+    def __contains__(self, slot):
+        return slot in self.transfers
+
+    def __len__(self):
+        return len(self.transfers)
+
+    class SlotTakenException(Exception):
+        """a block can't have two transfers of the same slot"""
+
+    class DuplicateTransactionException(Exception):
+        """the same transaction can't be submitted twice"""
+
+
+class BlockBuilder(object):
+    """
+    Produces operator blocks from the mempool.
+
+    `seal` builds the tree of the pooled transfers, precomputes the proof of
+    every slot and hands the block number and root to `submitter`, a
+    callable such as `BlockSubmitter.submit` or None to only build blocks.
+    Large blocks are hashed on a pool of `workers` processes.
+    """
+
+    def __init__(self, submitter=None, depth=64, first_block=CHILD_BLOCK_INTERVAL, workers=None):
+        self.submitter = submitter
+        self.depth = depth
+        self.workers = workers
+        self.mempool = Mempool()
+        self.next_block = first_block
+        self.last_block = None
+
+    def add(self, tx, signature=None):
+        self.mempool.add(tx, signature)
+
+    def seal(self, block_number=None):
+        """
+        Seals the pooled transfers as `block_number`, the next multiple of
+        `CHILD_BLOCK_INTERVAL` by default, and returns the `SealedBlock`. The
+        seal throughput covers building the tree and the proofs, not the
+        submission.
+        """
+        block_number = self.next_block if block_number is None else block_number
+        if self.last_block is not None and block_number <= self.last_block:
+            raise self.BlockOrderException('block {} sealed after block {}'.format(block_number, self.last_block))
+
+        started = time.perf_counter()
+        # the pool is only drained once the block is submitted, a failed
+        # submission leaves its transfers pooled and its number unused
+        transfers = self.mempool.transfers
+        leaves = {slot: tx.hash for slot, (tx, _) in transfers.items()}
+        if len(leaves) >= PARALLEL_SEAL_MIN:
+            tree = SparseMerkleTree.build_parallel(leaves, self.workers, self.depth)
+        else:
+            tree = SparseMerkleTree(self.depth, leaves)
+        proofs = tree.create_merkle_proofs()
+        block = SealedBlock(
+            block_number, tree.root, tree, proofs, transfers,
+            Throughput(len(transfers), time.perf_counter() - started)
+        )
+
+        if self.submitter is not None:
+            self.submitter(block_number, tree.root)
+        self.mempool.drain()
+        self.last_block = block_number
+        self.next_block = (block_number // CHILD_BLOCK_INTERVAL + 1) * CHILD_BLOCK_INTERVAL
+        return block
+
+    class BlockOrderException(Exception):
+        """blocks must be sealed in increasing block number order"""
@@ -0,0 +1,222 @@
+import threading
+import time
+from collections import deque
+
+
+class InFlightBlock(object):
+    """ A `submitBlock` transaction sent and not confirmed yet"""
+    __slots__ = ('block_number', 'root', 'nonce', 'tx_hash', 'sent_at')
+
+    def __init__(self, block_number, root, nonce):
+        self.block_number = block_number
+        self.root = root
+        self.nonce = nonce
+        self.tx_hash = None
+        self.sent_at = None
+
+
+class BlockSubmitter(object):
+    """
+    Pipelined `PlasmaContract.submitBlock` submission.
+
+    Every block gets the next nonce of `sender` explicitly, so up to
+    `max_in_flight` transactions are pending at once and `submit` returns as
+    soon as the transaction is sent. Nonces are assigned in block number
+    order, which is the order the chain includes them in, so blocks reach
+    `childChain` in increasing order as `require(blockNumber >= currentBlock)`
+    needs.
+
+    A background thread polls the receipts of the oldest block in flight.
+    A transaction the node no longer knows about, with its nonce not used
+    yet, was dropped: it and the later blocks the node lost as well are sent
+    again in order with their nonces unchanged. With its nonce used, it was
+    replaced by another transaction of `sender`. A replaced or reverted
+    block stops the pipeline, the error is raised by the next `submit` or
+    `flush`.
+
+    Blocks are sent through the node with the account unlocked with
+    `password`, or signed locally when `private_key` is given.
+    """
+
+    def __init__(self, w3, plasma_instance, sender, password='', private_key=None,
+                 max_in_flight=4, gas=None, gas_price=None, poll_interval=0.5, drop_timeout=60):
+        self.w3 = w3
+        self.plasma_instance = plasma_instance
+        self.sender = sender
+        self.password = password
+        self.private_key = private_key
+        self.max_in_flight = max_in_flight
+        self.gas = gas
+        self.gas_price = gas_price or w3.eth.gasPrice
+        self.poll_interval = poll_interval
+        self.drop_timeout = drop_timeout
+
+        self.nonce = w3.eth.getTransactionCount(sender, 'pending')
+        self.last_block = None
+        self.in_flight = deque()
+        self.confirmed = []
+        self.error = None
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._confirm, name='block-submitter', daemon=True)
+        self.thread.start()
+
+    def __call__(self, block_number, root):
+        return self.submit(block_number, root)
+
+    def submit(self, block_number, root):
+        """
+        Sends the `submitBlock` transaction of `block_number` and returns its
+        hash without waiting for it to be mined, unless `max_in_flight` blocks
+        are already pending.
+        """
+        with self.condition:
+            self._raise_error()
+            if self.last_block is not None and block_number <= self.last_block:
+                raise self.BlockOrderException(
+                    'block {} submitted after block {}'.format(block_number, self.last_block)
+                )
+            while len(self.in_flight) >= self.max_in_flight and self.error is None:
+                self.condition.wait()
+            self._raise_error()
+
+            # the nonce is reserved in block order, the confirm thread waits
+            # for the block to be sent before polling it
+            block = InFlightBlock(block_number, root, self.nonce)
+            previous_block = self.last_block
+            self.nonce += 1
+            self.last_block = block_number
+            self.in_flight.append(block)
+
+        # the RPC calls run unlocked so the confirm thread isn't held up
+        try:
+            self._send(block)
+        except Exception:
+            with self.condition:
+                if self.in_flight[-1] is block:
+                    # nothing was reserved after it, its nonce is free again
+                    self.in_flight.pop()
+                    self.nonce -= 1
+                    self.last_block = previous_block
+                else:
+                    self.error = self.SubmissionFailedException(
+                        'submitBlock({}) could not be sent, the later blocks are stuck behind its nonce'.format(
+                            block_number
+                        )
+                    )
+                self.condition.notify_all()
+            raise
+        with self.condition:
+            self.condition.notify_all()
+        return block.tx_hash
+
+    def flush(self, timeout=None):
+        """ Waits until every block sent is confirmed"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while self.in_flight and self.error is None:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError('{} blocks still in flight'.format(len(self.in_flight)))
+                self.condition.wait(remaining)
+            self._raise_error()
+        return self.confirmed
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def _send(self, block):
+        fn_submit = self.plasma_instance.functions.submitBlock(block.block_number, block.root)
+        if self.gas is None:
+            # the cost of submitBlock doesn't depend on its arguments
+            self.gas = int(fn_submit.estimateGas({'from': self.sender}) * 1.25)
+        transaction = fn_submit.buildTransaction({
+            'from': self.sender,
+            'nonce': block.nonce,
+            'gas': self.gas,
+            'gasPrice': self.gas_price,
+        })
+        if self.private_key is not None:
+            signed = self.w3.eth.account.signTransaction(transaction, self.private_key)
+            tx_hash = self.w3.eth.sendRawTransaction(signed.rawTransaction)
+        else:
+            self.w3.personal.unlockAccount(self.sender, self.password)
+            tx_hash = self.w3.eth.sendTransaction(transaction)
+        # a block is sent once it has a hash, it must have its send time by then
+        block.sent_at = time.monotonic()
+        block.tx_hash = tx_hash
+
+    def _confirm(self):
+        while True:
+            with self.condition:
+                while (not self.in_flight or self.in_flight[0].tx_hash is None) and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                block = self.in_flight[0]
+
+            try:
+                receipt = self.w3.eth.getTransactionReceipt(block.tx_hash)
+                if receipt is None:
+                    if self._dropped(block):
+                        self._resubmit()
+                    time.sleep(self.poll_interval)
+                    continue
+            except Exception as e:
+                self._fail(e)
+                return
+
+            with self.condition:
+                if not receipt.status:
+                    self.error = self.SubmissionFailedException(
+                        'submitBlock({}) reverted in {}'.format(block.block_number, block.tx_hash.hex())
+                    )
+                    self.condition.notify_all()
+                    return
+                self.in_flight.popleft()
+                self.confirmed.append((block.block_number, receipt))
+                self.condition.notify_all()
+
+    def _dropped(self, block):
+        """ Whether the node lost `block`, raises if its nonce went to another transaction"""
+        if time.monotonic() - block.sent_at < self.drop_timeout:
+            return False
+        if self.w3.eth.getTransaction(block.tx_hash) is not None:
+            # still pending, give it another timeout
+            block.sent_at = time.monotonic()
+            return False
+        if self.w3.eth.getTransactionCount(self.sender, 'latest') <= block.nonce:
+            return True
+        raise self.SubmissionFailedException(
+            'submitBlock({}) in {} was replaced, nonce {} is used by another transaction'.format(
+                block.block_number, block.tx_hash.hex(), block.nonce
+            )
+        )
+
+    def _resubmit(self):
+        """ Sends the blocks in flight the node lost again, in nonce order"""
+        with self.condition:
+            blocks = [block for block in self.in_flight if block.tx_hash is not None]
+        for block in blocks:
+            if self.w3.eth.getTransaction(block.tx_hash) is None:
+                self._send(block)
+
+    def _fail(self, error):
+        with self.condition:
+            if not isinstance(error, self.SubmissionFailedException):
+                error = self.SubmissionFailedException(str(error))
+            self.error = error
+            self.condition.notify_all()
+
+    class BlockOrderException(Exception):
+        """blocks must be submitted in increasing block number order"""
+
+    class SubmissionFailedException(Exception):
+        """a submitBlock transaction reverted or couldn't be sent"""
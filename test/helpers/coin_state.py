@@ -0,0 +1,268 @@
+from collections import namedtuple
+
+import numpy as np
+
+# multiplicative hashing of the slots, spreads consecutive slots over the table
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+EMPTY = -1
+
+# `PlasmaContract.State`, plus the coins deleted by `withdraw`
+NOT_EXITING = 0
+EXITING = 1
+EXITED = 2
+WITHDRAWN = 3
+
+# owners and denominations repeat across coins, records only keep their
+# position in the `owners` and `denominations` tables: 33 bytes per coin.
+COIN_DTYPE = np.dtype([
+    ('slot', '<u8'),
+    ('last_block', '<u8'),
+    ('deposit_block', '<u8'),
+    ('owner', '<u4'),
+    ('denomination', '<u4'),
+    ('state', 'u1'),
+])
+
+
+class Coin(namedtuple('Coin', ['owner', 'last_block', 'denomination', 'deposit_block', 'state'])):
+    """ State of one coin, as `CoinStateIndex.get` returns it"""
+    __slots__ = ()
+
+
+def _address_bytes(address):
+    if isinstance(address, str):
+        return bytes.fromhex(address[2:] if address.startswith('0x') else address)
+    return bytes(address)
+
+
+class CoinStateIndex(object):
+    """
+    In-memory state of the plasma coins keyed by slot.
+
+    Coins are dense `COIN_DTYPE` records, found through an open addressing
+    hash table of record positions with linear probing, kept at most three
+    quarters full so a lookup touches one or two table entries. Every lookup
+    and update works on arrays of slots at once. 10M coins take about 400MB.
+
+    The index follows the chain: deposits and exits through the contract
+    events given to `ingest_events`, transfers through the blocks given to
+    `ingest_block`.
+    """
+
+    def __init__(self, capacity=1024):
+        self.records = np.zeros(capacity, dtype=COIN_DTYPE)
+        self.count = 0
+        self.table = np.full(self._table_size(capacity), EMPTY, dtype=np.int32)
+        self.owners = []
+        self.owner_ids = {}
+        self.denominations = []
+        self.denomination_ids = {}
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, slot):
+        return self.find([slot])[0] >= 0
+
+    @property
+    def nbytes(self):
+        return self.records[:self.count].nbytes + self.table.nbytes
+
+    @staticmethod
+    def _table_size(count):
+        """ Smallest power of two keeping `count` coins under 3/4 of the table"""
+        return 2 ** max(count * 4 // 3, 1).bit_length()
+
+    def _home(self, slots):
+        shift = np.uint64(64 - (len(self.table) - 1).bit_length())
+        return ((slots * HASH_MULTIPLIER) >> shift).astype(np.int64)
+
+    def find(self, slots):
+        """ Record positions of `slots`, -1 for the ones that aren't indexed"""
+        slots = np.asarray(slots, dtype=np.uint64)
+        mask = len(self.table) - 1
+        positions = self._home(slots)
+        rows = np.full(len(slots), EMPTY, dtype=np.int64)
+        pending = np.arange(len(slots))
+        record_slots = self.records['slot']
+        while len(pending):
+            entries = self.table[positions[pending]]
+            empty = entries == EMPTY
+            hit = ~empty & (record_slots[np.maximum(entries, 0)] == slots[pending])
+            rows[pending[hit]] = entries[hit]
+            pending = pending[~empty & ~hit]
+            positions[pending] = (positions[pending] + 1) & mask
+        return rows
+
+    def _insert(self, slots, rows):
+        """ Points the table entries of the new `slots` to their record `rows`"""
+        mask = len(self.table) - 1
+        positions = self._home(slots)
+        pending = np.arange(len(slots))
+        while len(pending):
+            free = self.table[positions[pending]] == EMPTY
+            claims = pending[free]
+            # several slots of the batch can probe the same free entry, the
+            # first one gets it and the others keep probing.
+            claimed, first = np.unique(positions[claims], return_index=True)
+            self.table[claimed] = rows[claims[first]]
+            placed = np.zeros(len(slots), dtype=bool)
+            placed[claims[first]] = True
+            pending = pending[~placed[pending]]
+            positions[pending] = (positions[pending] + 1) & mask
+
+    def _reserve(self, count):
+        if count > len(self.records):
+            records = np.zeros(max(count, 2 * len(self.records)), dtype=COIN_DTYPE)
+            records[:self.count] = self.records[:self.count]
+            self.records = records
+        if 4 * count > 3 * len(self.table):
+            self.table = np.full(self._table_size(count), EMPTY, dtype=np.int32)
+            self._insert(self.records['slot'][:self.count], np.arange(self.count))
+
+    def owner_id(self, address):
+        """ Position of `address` in the owners table, added if needed"""
+        address = _address_bytes(address)
+        owner_id = self.owner_ids.get(address)
+        if owner_id is None:
+            owner_id = self.owner_ids[address] = len(self.owners)
+            self.owners.append(address)
+        return owner_id
+
+    def denomination_id(self, denomination):
+        denomination_id = self.denomination_ids.get(denomination)
+        if denomination_id is None:
+            denomination_id = self.denomination_ids[denomination] = len(self.denominations)
+            self.denominations.append(denomination)
+        return denomination_id
+
+    @staticmethod
+    def _ids(values, intern):
+        """ Table ids of `values`, interning each distinct value once"""
+        ids = {}
+        for value in values:
+            if value not in ids:
+                ids[value] = intern(value)
+        return np.array([ids[value] for value in values], dtype=np.uint32)
+
+    def upsert(self, slots, owners, last_blocks, denominations, deposit_blocks=None, states=None):
+        """
+        Sets the owner, last block, denomination, deposit block (the last
+        block by default) and state (NOT_EXITING by default) of the coins at
+        `slots`, indexing the ones that are new. Later entries win when a slot
+        is given more than once.
+        """
+        slots = np.asarray(slots, dtype=np.uint64)
+        owners = self._ids(owners, self.owner_id)
+        denominations = self._ids(denominations, self.denomination_id)
+        last_blocks = np.asarray(last_blocks, dtype=np.uint64)
+        deposit_blocks = last_blocks if deposit_blocks is None else np.asarray(deposit_blocks, dtype=np.uint64)
+        states = np.zeros(len(slots), dtype=np.uint8) if states is None else np.asarray(states, dtype=np.uint8)
+
+        # keep the last occurrence of every slot
+        _, last = np.unique(slots[::-1], return_index=True)
+        keep = np.sort(len(slots) - 1 - last)
+        slots = slots[keep]
+
+        rows = self.find(slots)
+        new = rows == EMPTY
+        added = int(new.sum())
+        if added:
+            self._reserve(self.count + added)
+            rows[new] = np.arange(self.count, self.count + added)
+            self.records['slot'][rows[new]] = slots[new]
+            self.count += added
+            self._insert(slots[new], rows[new])
+
+        self.records['owner'][rows] = owners[keep]
+        self.records['last_block'][rows] = last_blocks[keep]
+        self.records['denomination'][rows] = denominations[keep]
+        self.records['deposit_block'][rows] = deposit_blocks[keep]
+        self.records['state'][rows] = states[keep]
+
+    def transfer(self, slots, owners, block_number):
+        """
+        Moves the coins at `slots` to `owners` as of `block_number`. Returns
+        the mask of the slots that are indexed, the others are ignored.
+        """
+        rows = self.find(slots)
+        found = rows >= 0
+        owners = self._ids(owners, self.owner_id)
+        self.records['owner'][rows[found]] = owners[found]
+        self.records['last_block'][rows[found]] = block_number
+        return found
+
+    def set_state(self, slot, state, owner=None):
+        row = self.find([slot])[0]
+        if row < 0:
+            return False
+        self.records['state'][row] = state
+        if owner is not None:
+            self.records['owner'][row] = self.owner_id(owner)
+        return True
+
+    def ingest_block(self, block):
+        """ Applies the transfers of a `SealedBlock`"""
+        txs = [tx for tx, _ in block.transfers.values()]
+        return self.transfer([tx.slot for tx in txs], [tx.owner for tx in txs], block.number)
+
+    def ingest_events(self, events):
+        """
+        Applies decoded `PlasmaContract` logs in chain order: `Deposit` adds
+        the coin, `StartedExit`, `FinalizedExit`, `CoinReset` and `Withdrew`
+        move it through the exit states. Other events are ignored. Runs of
+        deposits are inserted at once.
+        """
+        deposits = []
+        for event in events:
+            name, args = event['event'], event['args']
+            if name == 'Deposit':
+                deposits.append(args)
+                continue
+            if deposits:
+                self._ingest_deposits(deposits)
+                deposits = []
+            if name == 'StartedExit':
+                self.set_state(args['slot'], EXITING)
+            elif name == 'FinalizedExit':
+                self.set_state(args['slot'], EXITED, args['owner'])
+            elif name == 'CoinReset':
+                self.set_state(args['slot'], NOT_EXITING)
+            elif name == 'Withdrew':
+                self.set_state(args['slot'], WITHDRAWN)
+        if deposits:
+            self._ingest_deposits(deposits)
+
+    def _ingest_deposits(self, deposits):
+        self.upsert(
+            [args['slot'] for args in deposits],
+            [args['from'] for args in deposits],
+            [args['blockNumber'] for args in deposits],
+            [args['denomination'] for args in deposits],
+        )
+
+    def get(self, slot):
+        """ `Coin` at `slot` or None"""
+        row = self.find([slot])[0]
+        if row < 0:
+            return None
+        record = self.records[row]
+        return Coin(
+            '0x' + self.owners[record['owner']].hex(),
+            int(record['last_block']),
+            self.denominations[record['denomination']],
+            int(record['deposit_block']),
+            int(record['state']),
+        )
+
+
+EVENTS = ('Deposit', 'StartedExit', 'FinalizedExit', 'CoinReset', 'Withdrew')
+
+
+def fetch_events(plasma_instance, from_block=0, to_block='latest'):
+    """ The coin state events of `plasma_instance` in chain order, for `CoinStateIndex.ingest_events`"""
+    events = []
+    for name in EVENTS:
+        event_filter = getattr(plasma_instance.events, name).createFilter(fromBlock=from_block, toBlock=to_block)
+        events.extend(event_filter.get_all_entries())
+    return sorted(events, key=lambda event: (event['blockNumber'], event['logIndex']))
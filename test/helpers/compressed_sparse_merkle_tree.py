@@ -0,0 +1,220 @@
+from bisect import bisect_left
+from collections import OrderedDict
+
+from helpers.hasher import keccak
+from helpers.sparse_merkle_tree import SparseMerkleTree, default_nodes, fold, get_root
+
+
+class Node(object):
+    """
+    A node of the compressed tree.
+
+    Leaves sit at level 0 with `index` being their uid. Every other node is a
+    branching point at (`level`, `index`) whose both children are non empty.
+    Children can sit any number of levels below their parent, the path in
+    between only has default siblings and is not stored. `left_hash` and
+    `right_hash` are the children folded up to `level - 1`.
+
+    Nodes are never mutated once created, updates copy the changed path.
+    """
+    __slots__ = ('level', 'index', 'hash', 'left', 'right', 'left_hash', 'right_hash')
+
+    def __init__(self, level, index, hash, left=None, right=None, left_hash=None, right_hash=None):
+        self.level = level
+        self.index = index
+        self.hash = hash
+        self.left = left
+        self.right = right
+        self.left_hash = left_hash
+        self.right_hash = right_hash
+
+    @property
+    def start(self):
+        """ first uid covered by this node"""
+        return self.index << self.level
+
+    def covers(self, uid):
+        return uid >> self.level == self.index
+
+
+class CompressedSparseMerkleTree(object):
+    """
+    Sparse merkle tree storing one node per branching point plus the leaves.
+
+    Produces the same root and proofs as `SparseMerkleTree` while keeping
+    about 2 * n nodes instead of depth * n. Default siblings on the paths
+    between stored nodes are folded in from `default_nodes` when needed.
+    """
+
+    def __init__(self, depth=64, leaves={}, store=None):
+        self.depth = depth
+        # optional (level, index, hash) -> node table, equal subtrees built
+        # through it are shared instead of duplicated.
+        self.store = store
+        if len(leaves) > 2 ** depth:
+            raise self.TreeSizeExceededException(
+                'tree with depth {} cannot have {} leaves'.format(
+                    depth, len(leaves)
+                )
+            )
+
+        self.default_nodes = default_nodes(self.depth)
+        atoms = [self.node(0, uid, leaves[uid]) for uid in sorted(leaves)]
+        self.top = self.build(atoms)
+        self.root = self.fold(self.top, self.depth)
+
+    @classmethod
+    def from_top(cls, top, depth=64, store=None):
+        """ Tree whose nodes are the ones below `top`, nothing is copied"""
+        self = cls(depth, store=store)
+        self.top = top
+        self.root = self.fold(top, depth)
+        return self
+
+    def node(self, level, index, hash, *children):
+        node = Node(level, index, hash, *children)
+        if self.store is None:
+            return node
+        return self.store.setdefault((level, index, hash), node)
+
+    @property
+    def leaves(self):
+        """ uid -> leaf hash mapping sorted by uid, built by walking the tree"""
+        return OrderedDict((node.index, node.hash) for node in self.iter_leaves(self.top))
+
+    def iter_leaves(self, node):
+        if node is None:
+            return
+        if node.level == 0:
+            yield node
+            return
+        yield from self.iter_leaves(node.left)
+        yield from self.iter_leaves(node.right)
+
+    def get(self, uid):
+        """ Returns the leaf hash at `uid` or None"""
+        node = self.top
+        while node is not None and node.covers(uid):
+            if node.level == 0:
+                return node.hash
+            node = node.right if (uid >> (node.level - 1)) & 1 else node.left
+        return None
+
+    def fold(self, node, level):
+        """ Hash of the subtree holding `node` at `level`, padded with default siblings"""
+        if node is None:
+            return self.default_nodes[level]
+        return fold(node.hash, node.level, node.index, level, self.depth)
+
+    def branch(self, level, left, right):
+        """ Creates the branching node at `level` above `left` and `right`"""
+        left_hash = self.fold(left, level - 1)
+        right_hash = self.fold(right, level - 1)
+        return self.node(level, left.index >> (level - left.level), keccak(left_hash + right_hash),
+                         left, right, left_hash, right_hash)
+
+    def build(self, atoms):
+        """
+        Builds the smallest tree holding `atoms`, a list of disjoint nodes sorted
+        by position, and returns its top node.
+        """
+        if not atoms:
+            return None
+        if len(atoms) == 1:
+            return atoms[0]
+        # the highest bit where the first and the last atom differ is where
+        # the tree branches, atoms being disjoint it is above all of them.
+        level = (atoms[0].start ^ atoms[-1].start).bit_length()
+        split_at = ((atoms[0].start >> level) << level) | (1 << (level - 1))
+        split = bisect_left([atom.start for atom in atoms], split_at)
+        return self.branch(level, self.build(atoms[:split]), self.build(atoms[split:]))
+
+    def merge(self, node, changes):
+        """
+        Applies `changes`, a list of (uid, leaf hash or None) sorted by uid, to
+        the tree below `node` and returns the new top node. Changed branching
+        points are rebuilt once per batch, untouched subtrees are shared.
+        """
+        if not changes:
+            return node
+        if node is None or node.level == 0:
+            changed = {uid for uid, _ in changes}
+            atoms = [self.node(0, uid, leaf_hash) for uid, leaf_hash in changes if leaf_hash is not None]
+            if node is not None and node.index not in changed:
+                atoms.append(node)
+                atoms.sort(key=lambda atom: atom.start)
+            return self.build(atoms)
+
+        uids = [uid for uid, _ in changes]
+        first = bisect_left(uids, node.start)
+        last = bisect_left(uids, (node.index + 1) << node.level)
+        inside = changes[first:last]
+        outside = changes[:first] + changes[last:]
+
+        inner = node
+        if inside:
+            middle = bisect_left(uids, node.start | (1 << (node.level - 1)), first, last) - first
+            children = [self.merge(node.left, inside[:middle]), self.merge(node.right, inside[middle:])]
+            inner = self.build([child for child in children if child is not None])
+
+        atoms = [self.node(0, uid, leaf_hash) for uid, leaf_hash in outside if leaf_hash is not None]
+        if inner is not None:
+            atoms.append(inner)
+            atoms.sort(key=lambda atom: atom.start)
+        return self.build(atoms)
+
+    def create_merkle_proof(self, uid):
+        # Same layout as `SparseMerkleTree.create_merkle_proof`, siblings are
+        # only stored at branching points so every other bit is 0.
+        siblings = {}
+        node = self.top
+        while node is not None:
+            if not node.covers(uid):
+                # the path to `uid` leaves the stored tree, `node` is the only
+                # non default sibling left, at the level where they diverge.
+                level = ((uid >> node.level) ^ node.index).bit_length() + node.level - 1
+                siblings[level] = self.fold(node, level)
+                break
+            if node.level == 0:
+                break
+            if (uid >> (node.level - 1)) & 1:
+                siblings[node.level - 1] = node.left_hash
+                node = node.right
+            else:
+                siblings[node.level - 1] = node.right_hash
+                node = node.left
+
+        proof = b''
+        proofbits = 0
+        for level in sorted(siblings):
+            proof += siblings[level]
+            proofbits += 2 ** level
+        proof_bytes = proofbits.to_bytes(8, byteorder='big')
+        return proof_bytes + proof
+
+    def verify(self, uid, proof):
+        """ Checks if the proof for the leaf at `uid` is valid"""
+        leaf = self.get(uid)
+        # in case the tx is not included, computed_hash is the default leaf
+        if leaf is None:
+            leaf = self.default_nodes[-1]
+        return get_root(leaf, uid, proof, self.depth) == self.root
+
+    def set(self, uid, leaf_hash):
+        """ Sets the leaf at `uid` and returns the new root"""
+        return self.update({uid: leaf_hash})
+
+    def delete(self, uid):
+        """ Removes the leaf at `uid` and returns the new root"""
+        return self.update({uid: None})
+
+    def update(self, changes):
+        """
+        Applies a batch of leaf changes and returns the new root.
+        `changes` maps uids to leaf hashes, a value of None deletes the leaf.
+        """
+        self.top = self.merge(self.top, sorted(changes.items(), key=lambda t: t[0]))
+        self.root = self.fold(self.top, self.depth)
+        return self.root
+
+    TreeSizeExceededException = SparseMerkleTree.TreeSizeExceededException
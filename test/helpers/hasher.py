@@ -0,0 +1,110 @@
+'''
+    keccak256 with a pluggable backend.
+
+    Every available backend is timed on import and the fastest one is used by
+    `keccak`, `keccak_many` and `keccak_pairs`. `select_backend` forces one,
+    `python helpers/hasher.py` prints the micro-benchmark.
+'''
+import os
+import time
+
+BACKENDS = {}
+
+try:
+    from Crypto.Hash import keccak as _pycryptodome_keccak
+
+    def _pycryptodome(data):
+        return _pycryptodome_keccak.new(digest_bits=256, data=data).digest()
+
+    BACKENDS['pycryptodome'] = _pycryptodome
+except ImportError:
+    pass
+
+try:
+    import sha3 as _pysha3
+
+    def _sha3(data):
+        return _pysha3.keccak_256(data).digest()
+
+    BACKENDS['pysha3'] = _sha3
+except ImportError:
+    pass
+
+try:
+    from eth_hash.auto import keccak as _eth_hash_keccak
+
+    def _eth_hash(data):
+        # eth-hash only takes bytes and bytearray, the other backends any buffer
+        if type(data) is memoryview:
+            data = data.tobytes()
+        return _eth_hash_keccak(data)
+
+    BACKENDS['eth-hash'] = _eth_hash
+except ImportError:
+    pass
+
+_hash = None
+BACKEND = None
+
+
+def keccak(data):
+    return _hash(data)
+
+
+def keccak_many(items):
+    """ keccak256 of every bytes object in `items`"""
+    return list(map(_hash, items))
+
+
+def keccak_pairs(left_buf, right_buf):
+    """
+    keccak256(left_i + right_i) for the 32 byte items of two contiguous
+    buffers of the same size, returned as one contiguous buffer of digests.
+    """
+    left_buf = bytes(left_buf)
+    right_buf = bytes(right_buf)
+    if len(left_buf) != len(right_buf) or len(left_buf) % 32:
+        raise ValueError('buffers of {} and {} bytes are not pairs of 32 byte items'.format(
+            len(left_buf), len(right_buf)
+        ))
+    return b''.join(map(
+        _hash, (left_buf[i: i + 32] + right_buf[i: i + 32] for i in range(0, len(left_buf), 32))
+    ))
+
+
+def benchmark(rounds=2_000):
+    """ Seconds each backend takes to hash `rounds` 64 byte messages"""
+    messages = [os.urandom(64) for _ in range(rounds)]
+    timings = {}
+    for name, backend in BACKENDS.items():
+        started = time.perf_counter()
+        for message in messages:
+            backend(message)
+        timings[name] = time.perf_counter() - started
+    return timings
+
+
+def select_backend(name=None):
+    """ Uses the `name` backend, or the fastest one according to `benchmark`"""
+    global _hash, BACKEND
+    if not BACKENDS:
+        raise ImportError('no keccak backend available, install pycryptodome, pysha3 or eth-hash')
+    if name is None:
+        timings = benchmark()
+        name = min(timings, key=timings.get)
+    if name not in BACKENDS:
+        raise ImportError('keccak backend {} is not available, available backends: {}'.format(
+            name, ', '.join(BACKENDS)
+        ))
+    _hash = BACKENDS[name]
+    BACKEND = name
+    return name
+
+
+select_backend(os.environ.get('KECCAK_BACKEND'))
+
+
+if __name__ == '__main__':
+    for backend_name, seconds in sorted(benchmark(20_000).items(), key=lambda t: t[1]):
+        print('{:<14}{:>10.0f} hashes/s'.format(backend_name, 20_000 / seconds))
+    print('selected: {}'.format(BACKEND))
@@ -0,0 +1,119 @@
+import threading
+from collections import OrderedDict
+from weakref import WeakKeyDictionary
+
+# rough per entry bookkeeping cost on top of the proof and key bytes
+ENTRY_OVERHEAD = 128
+
+
+class ProofCache(object):
+    """
+    Bounded LRU cache of merkle proofs keyed by (root, uid).
+
+    A root commits to the whole tree so a proof cached under a root stays
+    valid for any tree with that root. Trees going through `proof` are
+    watched: once a tree is mutated its previous root's entries are dropped.
+    Size is accounted in bytes, least recently used entries are evicted
+    first. Safe to share between threads.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        # root -> uids cached under it, for invalidation
+        self.roots = {}
+        self.tree_roots = WeakKeyDictionary()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def entry_size(root, proof):
+        return len(root) + len(proof) + ENTRY_OVERHEAD
+
+    def get(self, root, uid):
+        """ Cached proof of `uid` under `root` or None"""
+        key = (root, uid)
+        with self.lock:
+            proof = self.entries.get(key)
+            if proof is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return proof
+
+    def put(self, root, uid, proof):
+        key = (root, uid)
+        size = self.entry_size(root, proof)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entry_size(root, self.entries.pop(key))
+            self.entries[key] = proof
+            self.roots.setdefault(root, set()).add(uid)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._drop(*self.entries.popitem(last=False))
+                self.evictions += 1
+
+    def _drop(self, key, proof):
+        root, uid = key
+        self.size -= self.entry_size(root, proof)
+        uids = self.roots[root]
+        uids.discard(uid)
+        if not uids:
+            del self.roots[root]
+
+    def get_or_create(self, root, uid, create):
+        """ Cached proof or `create()`, which is then cached"""
+        proof = self.get(root, uid)
+        if proof is None:
+            proof = create()
+            self.put(root, uid, proof)
+        return proof
+
+    def proof(self, tree, uid):
+        """
+        Cached `tree.create_merkle_proof(uid)`. A proof computed while the
+        tree changed is returned without being cached, it may not match the
+        root read before; readers of a tree updated on another thread should
+        go through its `snapshot`.
+        """
+        root = tree.root
+        with self.lock:
+            previous = self.tree_roots.get(tree)
+            self.tree_roots[tree] = root
+        if previous is not None and previous != root:
+            self.invalidate(previous)
+        proof = self.get(root, uid)
+        if proof is None:
+            proof = tree.create_merkle_proof(uid)
+            if tree.root == root:
+                self.put(root, uid, proof)
+        return proof
+
+    def invalidate(self, root=None):
+        """ Drops the entries of `root`, or everything"""
+        with self.lock:
+            if root is None:
+                self.entries.clear()
+                self.roots.clear()
+                self.size = 0
+                return
+            for uid in self.roots.pop(root, ()):
+                proof = self.entries.pop((root, uid))
+                self.size -= self.entry_size(root, proof)
+
+    @property
+    def stats(self):
+        return {
+            'entries': len(self.entries),
+            'bytes': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
@@ -0,0 +1,259 @@
+'''
+    Operator split over worker processes by slot range.
+
+    `python -m helpers.sharded_operator`, run from test/, prints the seal
+    throughput for 1, 2 and 4 workers.
+'''
+import multiprocessing
+import os
+import random
+import time
+
+import numpy as np
+
+from helpers.admission import ACCEPTED, DUPLICATE_SLOT, AdmissionValidator
+from helpers.coin_state import CoinStateIndex
+from helpers.signature_verifier import SignatureVerifier
+from helpers.sparse_merkle_tree import (SparseMerkleTree, TreeLevel,
+                                        default_nodes)
+from helpers.throughput import Throughput
+from helpers.tx_batch import TransactionBatch
+
+
+class Shard(object):
+    """
+    State of the coins of one slot range: their `CoinStateIndex`, the
+    transfers admitted for the next block and, for every sealed block, the
+    levels of the block tree below `level`, where the range is made of whole
+    subtrees.
+
+    Blocks are sealed in two steps: `seal` only hashes, `commit` applies the
+    block once every shard sealed it, so a shard failing to seal leaves the
+    others untouched.
+    """
+
+    def __init__(self, depth=64, level=60):
+        self.depth = depth
+        self.level = level
+        self.index = CoinStateIndex()
+        # the shard is already one process of the operator's pool
+        self.validator = AdmissionValidator(self.index, SignatureVerifier(workers=1))
+        # slot -> (tx hash, new owner) of the transfers of the next block
+        self.pending = {}
+        self.blocks = {}
+        # (block number, levels) hashed by `seal`, waiting for `commit`
+        self.sealed = None
+
+    def ingest_events(self, events):
+        self.index.ingest_events(events)
+
+    def admit(self, records):
+        """
+        Recovers the signers of the transfers, validates them and keeps the
+        accepted ones, returns the reason codes
+        """
+        batch = TransactionBatch(records)
+        reasons, _ = self.validator.validate(batch)
+        for position, (slot, tx_hash) in enumerate(zip(records['slot'].tolist(), batch.hashes())):
+            if reasons[position] != ACCEPTED:
+                continue
+            if slot in self.pending:
+                reasons[position] = DUPLICATE_SLOT
+                continue
+            self.pending[slot] = (tx_hash, '0x' + records['owner'][position].tobytes().hex())
+        return reasons
+
+    def seal(self, block_number):
+        """
+        Hashes the admitted transfers up to `level` and returns the nodes of
+        that level as (indices, digests) with the number of transfers. The
+        shard's state only changes on `commit`.
+        """
+        leaves = TreeLevel.from_mapping({slot: tx_hash for slot, (tx_hash, _) in self.pending.items()})
+        levels = SparseMerkleTree.extend_tree([leaves], self.level, default_nodes(self.depth))
+        self.sealed = (block_number, levels)
+        return levels[-1].indices, bytes(levels[-1].digests), len(self.pending)
+
+    def commit(self, block_number):
+        """ Keeps the levels of the sealed `block_number` and applies its transfers to the index"""
+        if self.sealed is None or self.sealed[0] != block_number:
+            raise ValueError('block {} was not sealed'.format(block_number))
+        pending, self.pending = self.pending, {}
+        self.blocks[block_number] = self.sealed[1]
+        self.sealed = None
+        self.index.transfer(list(pending), [owner for _, owner in pending.values()], block_number)
+
+    def proof(self, block_number, slot):
+        """ Proof of `slot` in `block_number` for the levels below `level`"""
+        return SparseMerkleTree.from_levels(self.blocks[block_number]).create_merkle_proof(slot)
+
+
+def _serve(connection, depth, level):
+    """ Process entry point of a `ShardedOperator` worker"""
+    shard = Shard(depth, level)
+    while True:
+        command, args = connection.recv()
+        if command is None:
+            return
+        try:
+            connection.send((True, getattr(shard, command)(*args)))
+        except Exception as e:
+            connection.send((False, e))
+
+
+class ShardedOperator(object):
+    """
+    Operator whose coins are split between `workers` processes, each owning a
+    contiguous range of the slot space.
+
+    The top `depth - level` bits of a slot pick its worker, so every worker
+    holds whole subtrees rooted at `level`. Workers recover the signers of
+    their transfers, validate and hash them in parallel and return their
+    nodes at `level`; the coordinator only hashes the levels above into the
+    block root. Proofs are the owning worker's part below `level` followed
+    by the coordinator's part above.
+    """
+
+    def __init__(self, workers=None, depth=64, level=None):
+        self.workers = workers or os.cpu_count()
+        self.depth = depth
+        prefix_bits = max(1, (self.workers - 1).bit_length())
+        self.level = depth - prefix_bits if level is None else level
+        prefixes = 2 ** (depth - self.level)
+        # first slot of every worker's range, plus the end of the slot space
+        self.bounds = [(prefixes * i // self.workers) << self.level for i in range(self.workers)] + [2 ** depth]
+        self.default_nodes = default_nodes(depth)
+        self.tops = {}
+
+        self.connections = []
+        self.processes = []
+        for _ in range(self.workers):
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_serve, args=(worker_connection, depth, self.level), daemon=True)
+            process.start()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        for connection in self.connections:
+            connection.send((None, None))
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
+
+    def _call(self, calls):
+        """
+        Sends {worker: (command, args)} to the workers at once and gathers the
+        results. Every reply is read before the first error is raised, so no
+        reply is left in a pipe for the next call.
+        """
+        for worker, call in calls.items():
+            self.connections[worker].send(call)
+        replies = {worker: self.connections[worker].recv() for worker in calls}
+        for ok, result in replies.values():
+            if not ok:
+                raise result
+        return {worker: result for worker, (_, result) in replies.items()}
+
+    def shard_of(self, slots):
+        """ Worker owning each of `slots`"""
+        bounds = np.array(self.bounds[1:-1], dtype=np.uint64)
+        return np.searchsorted(bounds, np.asarray(slots, dtype=np.uint64), side='right')
+
+    def ingest_events(self, events):
+        """ Routes contract events to the workers owning their slots"""
+        routed = {}
+        for event in events:
+            worker = int(self.shard_of([event['args']['slot']])[0])
+            routed.setdefault(worker, []).append(event)
+        self._call({worker: ('ingest_events', (worker_events,)) for worker, worker_events in routed.items()})
+
+    def admit(self, batch):
+        """
+        Validates a signed `TransactionBatch` on the workers owning the slots,
+        signers included. Returns the reason codes in batch order.
+        """
+        shards = self.shard_of(batch.records['slot'])
+        positions = {worker: np.flatnonzero(shards == worker) for worker in range(self.workers)}
+        results = self._call({
+            worker: ('admit', (batch.records[rows],)) for worker, rows in positions.items() if len(rows)
+        })
+        reasons = np.zeros(len(batch), dtype=np.uint8)
+        for worker, worker_reasons in results.items():
+            reasons[positions[worker]] = worker_reasons
+        return reasons
+
+    def seal(self, block_number):
+        """
+        Seals `block_number` on every worker and returns its root, the one
+        `submitBlock` receives, with the `Throughput` of the seal. Workers
+        only commit the block once all of them sealed it.
+        """
+        started = time.perf_counter()
+        results = self._call({worker: ('seal', (block_number,)) for worker in range(self.workers)})
+        self._call({worker: ('commit', (block_number,)) for worker in range(self.workers)})
+        # ranges are in slot order, so are their nodes once concatenated
+        indices = np.concatenate([results[worker][0] for worker in range(self.workers)])
+        digests = b''.join(results[worker][1] for worker in range(self.workers))
+        top = SparseMerkleTree.extend_tree(
+            [TreeLevel(indices, bytearray(digests))], self.depth - self.level, self.default_nodes[self.level:]
+        )
+        self.tops[block_number] = top
+        root = top[-1].get(0, self.default_nodes[self.depth])
+        transfers = sum(results[worker][2] for worker in range(self.workers))
+        return root, Throughput(transfers, time.perf_counter() - started)
+
+    def proof(self, block_number, slot):
+        """ Proof of `slot` in `block_number`, in the `SparseMerkleTree` layout"""
+        worker = int(self.shard_of([slot])[0])
+        lower = self._call({worker: ('proof', (block_number, slot))})[worker]
+        proofbits = int.from_bytes(lower[:8], byteorder='big')
+        siblings = [lower[8:]]
+        index = slot >> self.level
+        for level, tree_level in enumerate(self.tops[block_number][:-1]):
+            position = tree_level.position(index ^ 1)
+            if position >= 0:
+                siblings.append(tree_level.digest(position))
+                proofbits |= 1 << (self.level + level)
+            index >>= 1
+        return proofbits.to_bytes(8, byteorder='big') + b''.join(siblings)
+
+
+def benchmark(workers_counts=(1, 2, 4), coins=20_000, transfers=2_000):
+    """
+    Seconds to admit, signer recovery included, and seal a block of
+    `transfers` for every worker count
+    """
+    from helpers.signer import LocalSigner, sign_batch
+    from helpers.transaction import PlasmaTransaction
+
+    owner = LocalSigner(os.urandom(32))
+    slots = [random.getrandbits(64) for _ in range(coins)]
+    events = [
+        {'event': 'Deposit', 'args': {'slot': slot, 'blockNumber': 1, 'denomination': 1, 'from': owner.address}}
+        for slot in slots
+    ]
+    txs = [PlasmaTransaction(slot, 1, 1, os.urandom(20)) for slot in random.sample(slots, transfers)]
+    signatures, _ = sign_batch(txs, [owner.private_key.to_bytes()] * transfers)
+    batch = TransactionBatch.from_transactions(txs, signatures)
+    timings = {}
+    for workers in workers_counts:
+        with ShardedOperator(workers) as operator:
+            operator.ingest_events(events)
+            started = time.perf_counter()
+            operator.admit(batch)
+            operator.seal(1_000)
+            timings[workers] = time.perf_counter() - started
+    return timings
+
+
+if __name__ == '__main__':
+    for workers, seconds in benchmark().items():
+        print('{} workers: {:.2f}s ({:.0f} tx/s)'.format(workers, seconds, 2_000 / seconds))
@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from helpers.signer import recover
+from helpers.throughput import Throughput
+
+
+def _recover_chunk(chunk):
+    """ Process pool entry point of `SignatureVerifier.recover_many`"""
+    return [recover(message_hash, signature) for message_hash, signature in chunk]
+
+
+class SignatureVerifier(object):
+    """
+    Bulk off-chain version of `ECVerify.ecverify`, run on incoming transfers
+    before they are admitted into a block.
+
+    Signers are recovered on a pool of `workers` processes, created on first
+    use and kept until `close`. Recovered signers go into a bounded LRU
+    cache keyed by (hash, signature), so a transfer seen again (resubmitted,
+    or checked again when the block is sealed) costs no ECDSA recovery.
+    Safe to share between threads.
+    """
+
+    def __init__(self, workers=None, cache_size=100_000, chunk_size=256):
+        self.workers = workers or os.cpu_count()
+        self.cache_size = cache_size
+        self.chunk_size = chunk_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def recover_many(self, items):
+        """
+        Signer address, lower case, of every (hash, signature) of `items`, the
+        zero address for malformed signatures like `ECDSA.recover`.
+        """
+        keys = [(bytes(message_hash), bytes(signature)) for message_hash, signature in items]
+        signers = [None] * len(keys)
+        missing = OrderedDict()
+        with self.lock:
+            for position, key in enumerate(keys):
+                signer = self.cache.get(key)
+                if signer is None:
+                    missing.setdefault(key, []).append(position)
+                    continue
+                self.cache.move_to_end(key)
+                signers[position] = signer
+            # both count positions, a key repeated in `items` is recovered
+            # once but missed at every position
+            misses = sum(map(len, missing.values()))
+            self.hits += len(keys) - misses
+            self.misses += misses
+
+        pending = list(missing)
+        chunks = [pending[start: start + self.chunk_size] for start in range(0, len(pending), self.chunk_size)]
+        if self.workers <= 1 or len(chunks) <= 1:
+            recovered = [_recover_chunk(chunk) for chunk in chunks]
+        else:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            recovered = list(self.executor.map(_recover_chunk, chunks))
+
+        with self.lock:
+            for key, signer in zip(pending, (signer for chunk in recovered for signer in chunk)):
+                signer = signer.lower()
+                for position in missing[key]:
+                    signers[position] = signer
+                self.cache[key] = signer
+                self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return signers
+
+    def verify(self, items):
+        """
+        Checks `(tx, signature, signer)` items, `tx` being a `PlasmaTransaction`
+        or its hash, as `ECVerify.ecverify(tx.hash, signature, signer)` would.
+        Returns the list of per item verdicts and the `Throughput`.
+        """
+        started = time.perf_counter()
+        items = list(items)
+        signers = self.recover_many((getattr(tx, 'hash', tx), signature) for tx, signature, _ in items)
+        verdicts = [recovered == signer.lower() for recovered, (_, _, signer) in zip(signers, items)]
+        return verdicts, Throughput(len(verdicts), time.perf_counter() - started)
+
+    def verify_transfers(self, transfers):
+        """
+        Checks `(prev_tx, tx, signature)` transfers as
+        `DoChecks.checkBothIncludedAndSigned` does: both transactions are about
+        the same slot and `tx` is signed by the owner of `prev_tx`. Deposits,
+        where `prev_tx` is None, must be signed by their own owner.
+        """
+        transfers = list(transfers)
+        items = []
+        for prev_tx, tx, signature in transfers:
+            owner = tx.owner if prev_tx is None else prev_tx.owner
+            items.append((tx, signature, '0x' + bytes(owner).hex()))
+        verdicts, throughput = self.verify(items)
+        verdicts = [
+            verdict and (prev_tx is None or prev_tx.slot == tx.slot)
+            for verdict, (prev_tx, tx, _) in zip(verdicts, transfers)
+        ]
+        return verdicts, throughput
+
+    @property
+    def stats(self):
+        return {
+            'entries': len(self.cache),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
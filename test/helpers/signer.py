@@ -0,0 +1,145 @@
+'''
+    Signers of off-chain plasma transactions.
+
+    Signatures are `web3.eth.sign` signatures: the transaction hash prefixed
+    with "\\x19Ethereum Signed Message:\\n32", hashed again and signed, packed
+    as r || s || v with v being 27 or 28, which is what `ECVerify.ecverify`
+    checks. `LocalSigner` signs in process with the account's private key,
+    `RpcSigner` asks the node to, `sign_batch` spreads local signing of many
+    transactions over a process pool.
+'''
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from eth_keys import keys
+from eth_keys.exceptions import BadSignature, ValidationError
+from hexbytes import HexBytes
+
+from helpers.hasher import keccak
+from helpers.throughput import Throughput
+
+SIGNED_MESSAGE_PREFIX = b'\x19Ethereum Signed Message:\n32'
+ZERO_ADDRESS = '0x' + '00' * 20
+
+
+def eth_signed_message_hash(message_hash):
+    """ Mirrors `ECDSA.toEthSignedMessageHash`"""
+    return keccak(SIGNED_MESSAGE_PREFIX + bytes(message_hash))
+
+
+class LocalSigner(object):
+    """ Signs with an in process private key, no node round trip"""
+    __slots__ = ('private_key', 'address')
+
+    def __init__(self, private_key):
+        self.private_key = keys.PrivateKey(bytes(private_key))
+        self.address = self.private_key.public_key.to_checksum_address()
+
+    def sign(self, message_hash):
+        signature = self.private_key.sign_msg_hash(eth_signed_message_hash(message_hash))
+        return HexBytes(signature.to_bytes()[:64] + bytes([signature.v + 27]))
+
+
+class RpcSigner(object):
+    """ Signs through `eth_sign` on the node holding the account"""
+
+    def __init__(self, w3, address, password):
+        self.w3 = w3
+        self.address = address
+        self.password = password
+
+    def sign(self, message_hash):
+        self.w3.personal.unlockAccount(self.address, self.password)
+        return self.w3.eth.sign(self.address, data=HexBytes(message_hash))
+
+
+def _sign_chunk(chunk):
+    """ Process pool entry point of `sign_batch`, returns the packed signatures"""
+    signers = {}
+    signatures = []
+    for message_hash, private_key in chunk:
+        signer = signers.get(private_key)
+        if signer is None:
+            signer = signers[private_key] = LocalSigner(private_key)
+        signatures.append(bytes(signer.sign(message_hash)))
+    return b''.join(signatures)
+
+
+def sign_batch(txs, keys, workers=None, chunk_size=None, executor=None):
+    """
+    Signs every transaction of `txs` with the private key at the same position
+    in `keys`, on a pool of `workers` processes. Callers signing many batches
+    pass a long lived `executor`, a `ProcessPoolExecutor`, so the processes
+    are started once instead of for every batch.
+
+    `txs` are `PlasmaTransaction`s or 32 byte hashes. They are cut in chunks
+    of `chunk_size`, a few per worker by default, and each chunk is signed by
+    one worker, which builds the signer of a key once per chunk.
+    Returns the signatures in the order of `txs` and the `Throughput`.
+    """
+    started = time.perf_counter()
+    if len(keys) != len(txs):
+        raise ValueError('{} keys for {} transactions'.format(len(keys), len(txs)))
+    jobs = [(bytes(getattr(tx, 'hash', tx)), bytes(private_key)) for tx, private_key in zip(txs, keys)]
+    workers = workers or os.cpu_count()
+    chunk_size = chunk_size or max(1, -(-len(jobs) // (4 * workers)))
+    chunks = [jobs[start: start + chunk_size] for start in range(0, len(jobs), chunk_size)]
+
+    if executor is not None and len(chunks) > 1:
+        packed = list(executor.map(_sign_chunk, chunks))
+    elif workers <= 1 or len(chunks) <= 1:
+        packed = [_sign_chunk(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            packed = list(executor.map(_sign_chunk, chunks))
+
+    signatures = [
+        HexBytes(chunk[offset: offset + 65])
+        for chunk in packed
+        for offset in range(0, len(chunk), 65)
+    ]
+    return signatures, Throughput(len(signatures), time.perf_counter() - started)
+
+
+# lower case address -> LocalSigner of the accounts whose key we hold
+KEYRING = {}
+
+
+def register(private_key):
+    """ Adds the key to the keyring and returns its signer"""
+    signer = LocalSigner(private_key)
+    KEYRING[signer.address.lower()] = signer
+    return signer
+
+
+def local_signer(address):
+    """ LocalSigner of `address` or None if its key isn't in the keyring"""
+    return KEYRING.get(address.lower())
+
+
+def recover(message_hash, signature):
+    """
+    Mirrors `ECVerify.recover`: the checksum address that signed `message_hash`
+    or the zero address for a malformed signature.
+    """
+    signature = bytes(signature)
+    if len(signature) != 65:
+        return ZERO_ADDRESS
+    v = signature[64]
+    if v < 27:
+        v += 27
+    if v != 27 and v != 28:
+        return ZERO_ADDRESS
+    try:
+        public_key = keys.Signature(signature[:64] + bytes([v - 27])).recover_public_key_from_msg_hash(
+            eth_signed_message_hash(message_hash)
+        )
+    except (BadSignature, ValidationError):
+        return ZERO_ADDRESS
+    return public_key.to_checksum_address()
+
+
+def ecverify(message_hash, signature, address):
+    """ Mirrors `ECVerify.ecverify`"""
+    return recover(message_hash, signature).lower() == address.lower()
@@ -1,6 +1,509 @@
-from collections import OrderedDict
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 
-from eth_utils.crypto import keccak
+import numpy as np
+
+from helpers.hasher import keccak, keccak_pairs
+from helpers.throughput import Throughput
+
+# numpy refuses to shift uint64 arrays by python ints
+ONE = np.uint64(1)
+
+# changes a `TreeLevel` overlay holds before being merged, at least
+OVERLAY_MIN = 256
+# up to this many changes, paths are rehashed node by node instead of
+# level by level, array calls cost more than they save on a few nodes
+SCALAR_UPDATE_MAX = 16
+# snapshot levels are read from several threads, their merges must not interleave
+_MERGE_LOCK = threading.Lock()
+EMPTY_OVERLAY = (np.zeros(0, dtype=np.uint64), np.zeros((0, 32), dtype=np.uint8), np.zeros(0, dtype=bool))
+
+# snapshot file: a header page with the magic, format version, depth and
+# the (node count, indices offset, digests offset) of every level, then the
+# little endian uint64 indices and the digests of each level, every section
+# starting on a page boundary so it can be used straight from a mmap.
+SNAPSHOT_MAGIC = b'PLASMSMT'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct('<8sII')
+SNAPSHOT_LEVEL = struct.Struct('<QQQ')
+PAGE_SIZE = 4096
+
+
+def _page_align(offset):
+    return -(-offset // PAGE_SIZE) * PAGE_SIZE
+
+
+@lru_cache(maxsize=None)
+def default_nodes(depth):
+    """
+    Default nodes are the nodes whose children are both empty nodes at each
+    level. The table only depends on the depth so it is shared by every tree.
+    """
+    default_hash = keccak(b'\x00' * 32)
+    nodes = [default_hash]
+    for level in range(1, depth + 1):
+        prev_default = nodes[level - 1]
+        nodes.append(keccak(prev_default * 2))
+    return tuple(nodes)
+
+
+def fold(node_hash, level, index, to_level, depth=64):
+    """
+    Hashes the node at (`level`, `index`) up to `to_level` when every sibling
+    on the way is a default node.
+    """
+    defaults = default_nodes(depth)
+    for lvl in range(level, to_level):
+        if index % 2 == 0:
+            node_hash = keccak(node_hash + defaults[lvl])
+        else:
+            node_hash = keccak(defaults[lvl] + node_hash)
+        index = index // 2
+    return node_hash
+
+
+def get_root(leaf, index, proof, depth=64):
+    """
+    Computes the root reached by `leaf` at `index` with the given proof.
+    Mirrors `SparseMerkleTree.sol::getRoot`.
+    """
+    assert len(proof) <= 2056
+
+    defaults = default_nodes(depth)
+    proofbits = int.from_bytes((proof[0:8]), byteorder='big')
+    p = 8
+    computed_hash = leaf
+    for d in range(depth):
+        if proofbits % 2 == 0:
+            proof_element = defaults[d]
+        else:
+            proof_element = proof[p: p + 32]
+            p += 32
+        if index % 2 == 0:
+            computed_hash = keccak(computed_hash + proof_element)
+        else:
+            computed_hash = keccak(proof_element + computed_hash)
+        proofbits = proofbits // 2
+        index = index // 2
+    return computed_hash
+
+
+def _find_sorted(keys, indices):
+    """
+    Positions of the sorted `indices` in the sorted `keys` and the mask of
+    the ones that are present.
+    """
+    indices = np.asarray(indices, dtype=np.uint64)
+    positions = np.searchsorted(keys, indices)
+    if not len(keys):
+        return positions, np.zeros(len(indices), dtype=bool)
+    found = keys[np.minimum(positions, len(keys) - 1)] == indices
+    return positions, found
+
+
+def _matrix(digests):
+    """ (n, 32) uint8 view on a packed digests buffer"""
+    return np.frombuffer(digests, dtype=np.uint8).reshape(-1, 32)
+
+
+def _build_subtree(job):
+    """ Process pool entry point of `SparseMerkleTree.build_parallel`"""
+    subtree_depth, depth, indices, digests = job
+    tree = SparseMerkleTree.extend_tree([TreeLevel(indices, bytearray(digests))], subtree_depth, default_nodes(depth))
+    return [(tree_level.indices, bytes(tree_level.digests)) for tree_level in tree]
+
+
+class TreeLevel(Mapping):
+    """
+    One level of the tree: the sorted uint64 indices of its non default nodes
+    and their 32 byte digests packed in one contiguous buffer, the digest of
+    `indices[i]` being `digests[32 * i: 32 * i + 32]`.
+
+    Reads like a read only {index: digest} mapping so callers of `tree[level]`
+    and `leaves` don't change.
+
+    Nodes added or removed, and nodes overwritten while the buffers are
+    `shared` with a snapshot or read only, go to a small sorted overlay
+    (indices, (m, 32) digests, mask unset for removed nodes) instead of
+    being written to the arrays, which would have to be copied whole. The
+    overlay is merged into new arrays once it outgrows the square root of
+    the level, or when the whole arrays are read through `indices`,
+    `digests` or `matrix`. `base` (indices, their memoryview, digests) and
+    `overlay` are replaced as a whole, and the buffers are only written to
+    while not shared, so concurrent readers of a snapshot see one state or
+    the other.
+    """
+    __slots__ = ('base', 'overlay', 'shared', 'count')
+
+    def __init__(self, indices=None, digests=None, shared=False):
+        indices = np.zeros(0, dtype=np.uint64) if indices is None else indices
+        digests = bytearray() if digests is None else digests
+        assert len(digests) == 32 * len(indices)
+        # bisect over a memoryview beats a scalar numpy call by far
+        self.base = (indices, memoryview(indices), digests)
+        self.overlay = EMPTY_OVERLAY
+        self.shared = shared
+        self.count = len(indices)
+
+    @classmethod
+    def from_mapping(cls, leaves):
+        """ Converts an {index: digest} mapping"""
+        ordered = sorted(leaves.items(), key=lambda t: t[0])
+        indices = np.array([index for index, _ in ordered], dtype=np.uint64)
+        return cls(indices, bytearray(b''.join(digest for _, digest in ordered)))
+
+    @property
+    def indices(self):
+        self.merge()
+        return self.base[0]
+
+    @property
+    def digests(self):
+        self.merge()
+        return self.base[2]
+
+    def matrix(self):
+        """ (n, 32) uint8 view on the digests"""
+        return _matrix(self.digests)
+
+    def share(self):
+        """ Level reading the same nodes, this one stops writing to the buffers they share"""
+        self.shared = True
+        level = TreeLevel.__new__(TreeLevel)
+        level.base = self.base
+        level.overlay = self.overlay
+        level.shared = True
+        level.count = self.count
+        return level
+
+    def merge(self):
+        """ Folds the overlay into new arrays"""
+        if not len(self.overlay[0]):
+            return
+        with _MERGE_LOCK:
+            overlay_indices, overlay_digests, overlay_keep = self.overlay
+            if not len(overlay_indices):
+                return
+            indices, _, digests = self.base
+            positions, found = _find_sorted(indices, overlay_indices)
+            kept = np.ones(len(indices), dtype=bool)
+            kept[positions[found]] = False
+            base_indices = indices[kept]
+            at = np.searchsorted(base_indices, overlay_indices[overlay_keep])
+            indices = np.insert(base_indices, at, overlay_indices[overlay_keep])
+            digests = np.insert(_matrix(digests)[kept], at, overlay_digests[overlay_keep], axis=0)
+            self.base = (indices, memoryview(indices), bytearray(digests.tobytes()))
+            self.overlay = EMPTY_OVERLAY
+            self.shared = False
+
+    def find(self, indices):
+        """
+        Vectorized lookup of sorted `indices`, returns their positions in the
+        level and a mask of the ones that are present.
+        """
+        return _find_sorted(self.indices, indices)
+
+    def lookup(self, indices, default_node):
+        """
+        (n, 32) digests of the nodes at the sorted `indices`, `default_node`
+        for the ones that aren't stored, and the mask of the stored ones.
+        Reads through the overlay without merging it.
+        """
+        base_indices, _, base_digests = self.base
+        overlay_indices, overlay_digests, overlay_keep = self.overlay
+        indices = np.asarray(indices, dtype=np.uint64)
+        default_row = np.frombuffer(default_node, dtype=np.uint8)
+        digests = np.empty((len(indices), 32), dtype=np.uint8)
+        digests[:] = default_row
+        positions, found = _find_sorted(base_indices, indices)
+        digests[found] = _matrix(base_digests)[positions[found]]
+        if len(overlay_indices):
+            positions, in_overlay = _find_sorted(overlay_indices, indices)
+            rows, positions = np.flatnonzero(in_overlay), positions[in_overlay]
+            kept = overlay_keep[positions]
+            found[rows] = kept
+            digests[rows[kept]] = overlay_digests[positions[kept]]
+            digests[rows[~kept]] = default_row
+        return digests, found
+
+    def node(self, index):
+        """ Digest of the node at `index`, None for a default node"""
+        overlay_indices, overlay_digests, overlay_keep = self.overlay
+        if len(overlay_indices):
+            keys = memoryview(overlay_indices)
+            position = bisect_left(keys, index)
+            if position < len(keys) and keys[position] == index:
+                return overlay_digests[position].tobytes() if overlay_keep[position] else None
+        _, keys, digests = self.base
+        position = bisect_left(keys, index)
+        if position < len(keys) and keys[position] == index:
+            return bytes(digests[32 * position: 32 * position + 32])
+        return None
+
+    def split_level(self, index):
+        """
+        Lowest level holding a non default sibling of the path of `index`,
+        the highest bit where `index` differs from its closest stored
+        neighbours. Below it every sibling is a default node. Nodes removed
+        through the overlay still count, which can only lower the level.
+        """
+        level = 64
+        for keys in (self.base[1], memoryview(self.overlay[0])):
+            position = bisect_left(keys, index)
+            after = position + 1 if position < len(keys) and keys[position] == index else position
+            if position > 0:
+                level = min(level, (keys[position - 1] ^ index).bit_length() - 1)
+            if after < len(keys):
+                level = min(level, (keys[after] ^ index).bit_length() - 1)
+        return level
+
+    def position(self, index):
+        """ Position of `index` in the level or -1"""
+        self.merge()
+        keys = self.base[1]
+        position = bisect_left(keys, index)
+        if position < len(keys) and keys[position] == index:
+            return position
+        return -1
+
+    def digest(self, position):
+        return bytes(self.digests[32 * position: 32 * position + 32])
+
+    def _writable(self):
+        return not self.shared and isinstance(self.base[2], bytearray)
+
+    def apply(self, indices, digests, keep):
+        """
+        Writes the nodes at the sorted `indices`. `digests` holds the new values
+        of the nodes where `keep` is set, the others became default nodes and
+        are removed. Stored nodes are overwritten in place when the buffers
+        are private and writable, every other change goes to the overlay, so
+        a change never copies the whole level.
+        """
+        base_indices, _, base_digests = self.base
+        overlay_indices, overlay_digests, overlay_keep = self.overlay
+        indices = np.asarray(indices, dtype=np.uint64)
+        values = np.zeros((len(indices), 32), dtype=np.uint8)
+        values[keep] = digests
+        positions, in_base = _find_sorted(base_indices, indices)
+        overlay_positions, in_overlay = _find_sorted(overlay_indices, indices)
+        existed = in_base.copy()
+        existed[in_overlay] = overlay_keep[overlay_positions[in_overlay]]
+        self.count += int(keep.sum()) - int(existed.sum())
+
+        in_place = keep & in_base & self._writable()
+        if in_place.any():
+            _matrix(base_digests)[positions[in_place]] = values[in_place]
+
+        # the arrays already hold the in place writes and miss the removed
+        # nodes that only were in the overlay, the rest goes to the overlay
+        overlaid = ~in_place & (keep | in_base)
+        stale = np.zeros(len(overlay_indices), dtype=bool)
+        stale[overlay_positions[in_overlay]] = True
+        if stale.any() or overlaid.any():
+            at = np.searchsorted(overlay_indices[~stale], indices[overlaid])
+            self.overlay = (
+                np.insert(overlay_indices[~stale], at, indices[overlaid]),
+                np.insert(overlay_digests[~stale], at, values[overlaid], axis=0),
+                np.insert(overlay_keep[~stale], at, keep[overlaid]),
+            )
+            self._merge_if_large()
+
+    def put(self, index, digest):
+        """ `apply` of the single node at `index`, a `digest` of None removes it"""
+        _, keys, base_digests = self.base
+        overlay_indices, overlay_digests, overlay_keep = self.overlay
+        position = bisect_left(keys, index)
+        in_base = position < len(keys) and keys[position] == index
+        overlay_keys = memoryview(overlay_indices)
+        overlay_position = bisect_left(overlay_keys, index)
+        in_overlay = overlay_position < len(overlay_keys) and overlay_keys[overlay_position] == index
+        existed = bool(overlay_keep[overlay_position]) if in_overlay else in_base
+        self.count += (digest is not None) - existed
+
+        if in_overlay:
+            overlay_indices = np.delete(overlay_indices, overlay_position)
+            overlay_digests = np.delete(overlay_digests, overlay_position, axis=0)
+            overlay_keep = np.delete(overlay_keep, overlay_position)
+        if digest is not None and in_base and self._writable():
+            base_digests[32 * position: 32 * position + 32] = digest
+        elif digest is not None or in_base:
+            value = np.zeros(32, dtype=np.uint8) if digest is None else np.frombuffer(digest, dtype=np.uint8)
+            overlay_indices = np.insert(overlay_indices, overlay_position, index)
+            overlay_digests = np.insert(overlay_digests, overlay_position, value, axis=0)
+            overlay_keep = np.insert(overlay_keep, overlay_position, digest is not None)
+        self.overlay = (overlay_indices, overlay_digests, overlay_keep)
+        self._merge_if_large()
+
+    def _merge_if_large(self):
+        if len(self.overlay[0]) > max(OVERLAY_MIN, math.isqrt(len(self.base[0]))):
+            self.merge()
+
+    def __getitem__(self, index):
+        digest = self.node(index)
+        if digest is None:
+            raise KeyError(index)
+        return digest
+
+    def __contains__(self, index):
+        return self.node(index) is not None
+
+    def __iter__(self):
+        return iter(self.indices.tolist())
+
+    def __len__(self):
+        return self.count
+
+    def items(self):
+        return zip(self.indices.tolist(), map(bytes, self.matrix()))
+
+
+def verify_proofs(root, items, depth=64, memo=None):
+    """
+    Verifies `(uid, leaf_hash, proof)` items against `root` without a tree.
+
+    Nodes of every path proven valid, and their siblings, are memoized in
+    `memo` under `root` (pass the same dict again for more proofs, nodes
+    proven against one root are never used for another). Once a later proof
+    reaches a memoized node its remaining elements are only compared with
+    the memoized siblings, no more hashing is needed.
+
+    Returns the list of per item results and the `Throughput`.
+    """
+    started = time.perf_counter()
+    defaults = default_nodes(depth)
+    memo = {} if memo is None else memo
+    nodes = memo.setdefault(bytes(root), {})
+    results = []
+    for uid, leaf_hash, proof in items:
+        if len(proof) > 2056 or len(proof) < 8 or (len(proof) - 8) % 32:
+            results.append(False)
+            continue
+
+        proofbits = int.from_bytes((proof[0:8]), byteorder='big')
+        computed_hash = leaf_hash
+        index = uid
+        p = 8
+        path = []
+        proven = False
+        valid = True
+        for d in range(depth):
+            if proofbits % 2 == 0:
+                proof_element = defaults[d]
+            else:
+                proof_element = proof[p: p + 32]
+                p += 32
+                if len(proof_element) != 32:
+                    valid = False
+                    break
+            proofbits = proofbits // 2
+
+            if not proven:
+                known = nodes.get((d, index))
+                if known is not None:
+                    if known != computed_hash:
+                        valid = False
+                        break
+                    proven = True
+            if proven:
+                if nodes.get((d, index ^ 1)) != proof_element:
+                    valid = False
+                    break
+                index = index // 2
+                continue
+
+            path.append(((d, index), computed_hash))
+            path.append(((d, index ^ 1), proof_element))
+            if index % 2 == 0:
+                computed_hash = keccak(computed_hash + proof_element)
+            else:
+                computed_hash = keccak(proof_element + computed_hash)
+            index = index // 2
+
+        valid = valid and (proven or computed_hash == root)
+        if valid:
+            nodes.update(path)
+        results.append(valid)
+    return results, Throughput(len(results), time.perf_counter() - started)
+
+
+def multiproof_siblings(uids, depth=64):
+    """
+    Yields, level by level, the sorted indices of the siblings a multiproof
+    of `uids` has to provide: the siblings of the nodes on the paths of the
+    uids that aren't on those paths themselves.
+    """
+    known = sorted(set(uids))
+    for level in range(depth):
+        known_set = set(known)
+        yield level, [index ^ 1 for index in known if index ^ 1 not in known_set]
+        known = sorted({index // 2 for index in known})
+
+
+def verify_multiproof(root, leaves, multiproof, depth=64):
+    """
+    Checks a multiproof made by `SparseMerkleTree.create_multiproof` for the
+    {uid: leaf_hash} `leaves` against `root`. Every node on the paths of the
+    leaves is hashed once.
+    """
+    defaults = default_nodes(depth)
+    slots = sum(len(siblings) for _, siblings in multiproof_siblings(leaves, depth))
+    bitmap_size = (slots + 7) // 8
+    bitmap = int.from_bytes(multiproof[:bitmap_size], byteorder='little')
+    if len(multiproof) != bitmap_size + 32 * bin(bitmap).count('1') or bitmap >> slots:
+        return False
+
+    nodes = dict(leaves)
+    slot = 0
+    p = bitmap_size
+    for level, siblings in multiproof_siblings(leaves, depth):
+        for index in siblings:
+            if (bitmap >> slot) & 1:
+                nodes[index] = multiproof[p: p + 32]
+                p += 32
+            else:
+                nodes[index] = defaults[level]
+            slot += 1
+        parents = {}
+        for index in sorted(nodes):
+            if index % 2 == 0:
+                parents[index // 2] = keccak(nodes[index] + nodes[index + 1])
+        nodes = parents
+    return nodes.get(0) == root
+
+
+class MerkleProofs(Mapping):
+    """
+    Proofs of many leaves packed in a single buffer, read as a {uid: proof}
+    mapping. The proof of `uids[i]` is `buffer[offsets[i]: offsets[i + 1]]`.
+    """
+    __slots__ = ('uids', 'buffer', 'offsets')
+
+    def __init__(self, uids, buffer, offsets):
+        self.uids = uids
+        self.buffer = buffer
+        self.offsets = offsets
+
+    def __getitem__(self, uid):
+        keys = memoryview(self.uids)
+        position = bisect_left(keys, uid)
+        if position == len(keys) or keys[position] != uid:
+            raise KeyError(uid)
+        return self.buffer[self.offsets[position]: self.offsets[position + 1]]
+
+    def __iter__(self):
+        return iter(self.uids.tolist())
+
+    def __len__(self):
+        return len(self.uids)
 
 
 class SparseMerkleTree(object):
@@ -13,56 +516,159 @@ class SparseMerkleTree(object):
                 )
             )
 
-        # Sort the transaction dict by index.
-        self.leaves = OrderedDict(sorted(leaves.items(), key=lambda t: t[0]))
         self.default_nodes = self.create_default_nodes(self.depth)
-        if leaves:
-            self.tree = self.create_tree(
-                self.leaves, self.depth, self.default_nodes
+        # the leaves mapping is converted into the sorted level 0 arrays.
+        self.tree = self.create_tree(
+            TreeLevel.from_mapping(leaves), self.depth, self.default_nodes
+        )
+        self.leaves = self.tree[0]
+        self.root = self.tree[-1].get(0, self.default_nodes[self.depth])
+
+    @classmethod
+    def from_levels(cls, tree):
+        """ Wraps already built levels, level 0 being the leaves"""
+        self = cls.__new__(cls)
+        self.depth = len(tree) - 1
+        self.default_nodes = self.create_default_nodes(self.depth)
+        self.tree = tree
+        self.leaves = self.tree[0]
+        self.root = self.tree[-1].get(0, self.default_nodes[self.depth])
+        return self
+
+    def save(self, path):
+        """ Writes the tree to a snapshot file that `load` maps back"""
+        offset = _page_align(SNAPSHOT_HEADER.size + SNAPSHOT_LEVEL.size * len(self.tree))
+        sections = []
+        table = []
+        for tree_level in self.tree:
+            indices_offset = offset
+            digests_offset = _page_align(indices_offset + 8 * len(tree_level))
+            offset = _page_align(digests_offset + len(tree_level.digests))
+            table.append(SNAPSHOT_LEVEL.pack(len(tree_level), indices_offset, digests_offset))
+            sections.append((indices_offset, tree_level.indices.astype('<u8').tobytes()))
+            sections.append((digests_offset, tree_level.digests))
+
+        with open(path, 'wb') as f:
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, self.depth))
+            f.write(b''.join(table))
+            for section_offset, data in sections:
+                f.write(b'\x00' * (section_offset - f.tell()))
+                f.write(data)
+            f.truncate(offset)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Maps a snapshot written by `save`. Levels are numpy views on the mapped
+        file, nothing is parsed or rehashed so proofs are available at once and
+        pages are only read when touched. A level is copied to memory the first
+        time the tree is updated.
+        """
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, depth = SNAPSHOT_HEADER.unpack_from(mapped)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise cls.SnapshotFormatException('{} is not a version {} snapshot'.format(path, SNAPSHOT_VERSION))
+
+        tree = []
+        view = memoryview(mapped)
+        for level in range(depth + 1):
+            count, indices_offset, digests_offset = SNAPSHOT_LEVEL.unpack_from(
+                mapped, SNAPSHOT_HEADER.size + SNAPSHOT_LEVEL.size * level
             )
-            self.root = self.tree[-1][0]
-        else:
-            self.tree = []
-            self.root = self.default_nodes[self.depth]
+            indices = np.frombuffer(mapped, dtype='<u8', count=count, offset=indices_offset)
+            tree.append(TreeLevel(indices, view[digests_offset: digests_offset + 32 * count]))
+        return cls.from_levels(tree)
+
+    @classmethod
+    def build_parallel(cls, leaves, workers=None, depth=64, prefix_bits=None):
+        """
+        Builds the tree on a pool of `workers` processes.
+
+        Leaves are split by the top `prefix_bits` bits of their uid, each of
+        the 2 ** prefix_bits subtrees is built by a worker and the subtree
+        roots are then hashed into the top levels. The result is a regular
+        tree, proofs work as usual.
+        """
+        workers = workers or os.cpu_count()
+        if workers <= 1 or not leaves:
+            return cls(depth, leaves)
+        if len(leaves) > 2 ** depth:
+            raise cls.TreeSizeExceededException(
+                'tree with depth {} cannot have {} leaves'.format(
+                    depth, len(leaves)
+                )
+            )
+        # a few subtrees per worker keeps them busy when slots are unevenly spread
+        prefix_bits = prefix_bits or min(depth, (4 * workers - 1).bit_length())
+        subtree_depth = depth - prefix_bits
+
+        ordered_leaves = TreeLevel.from_mapping(leaves)
+        uids = ordered_leaves.indices
+        prefixes = np.unique(uids >> np.uint64(subtree_depth))
+        bounds = np.searchsorted(uids, prefixes << np.uint64(subtree_depth)).tolist() + [len(uids)]
+        mask = np.uint64(2 ** subtree_depth - 1)
+        jobs = [
+            (subtree_depth, depth, uids[start:end] & mask, bytes(ordered_leaves.digests[32 * start: 32 * end]))
+            for start, end in zip(bounds, bounds[1:])
+        ]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            subtrees = list(executor.map(_build_subtree, jobs))
+
+        # subtrees are ordered by prefix, so concatenating their levels keeps
+        # every level sorted.
+        tree = []
+        for level in range(subtree_depth + 1):
+            shift = np.uint64(subtree_depth - level)
+            indices = [subtree[level][0] | (np.uint64(prefix) << shift)
+                       for prefix, subtree in zip(prefixes.tolist(), subtrees)]
+            digests = b''.join(subtree[level][1] for subtree in subtrees)
+            tree.append(TreeLevel(np.concatenate(indices), bytearray(digests)))
+        return cls.from_levels(cls.extend_tree(tree, depth, default_nodes(depth)))
+
+    def snapshot(self):
+        """
+        Immutable view of the tree as it is now, for proof readers on other
+        threads while this tree keeps being updated.
+
+        The view shares every level buffer with the tree, which copies a level
+        the first time it writes to it afterwards, so taking a snapshot is
+        O(depth) and neither side ever waits for the other. Take it from the
+        thread doing the updates, between two updates.
+        """
+        return SparseMerkleTreeSnapshot.from_levels([tree_level.share() for tree_level in self.tree])
 
     def create_default_nodes(self, depth):
-        # Default nodes are the nodes whose children are both empty nodes at
-        # each level.
-        default_hash = keccak(b'\x00' * 32)
-        default_nodes = [default_hash]
-        for level in range(1, depth + 1):
-            prev_default = default_nodes[level - 1]
-            default_nodes.append(keccak(prev_default * 2))
-        return default_nodes
+        return default_nodes(depth)
 
     def create_tree(self, ordered_leaves, depth, default_nodes):
-        tree = [ordered_leaves]
-        tree_level = ordered_leaves
-        for level in range(depth):
-            next_level = {}
-            for index, value in tree_level.items():
-                if index % 2 == 0:
-                    co_index = index + 1
-                    if co_index in tree_level:
-                        next_level[index // 2] = keccak(
-                            value + tree_level[co_index]
-                        )
-                    else:
-                        next_level[index // 2] = keccak(
-                            value + default_nodes[level]
-                        )
-                else:
-                    # If the node is a right node, check if its left sibling is
-                    # a default node.
-                    co_index = index - 1
-                    if co_index not in tree_level:
-                        next_level[index // 2] = keccak(
-                            default_nodes[level] + value
-                        )
-            tree_level = next_level
+        return self.extend_tree([ordered_leaves], depth, default_nodes)
+
+    @classmethod
+    def extend_tree(cls, tree, depth, default_nodes):
+        """ Hashes the levels above the last one in `tree` up to `depth`"""
+        tree_level = tree[-1]
+        for level in range(len(tree) - 1, depth):
+            # every parent of a non default node is non default
+            parents = np.unique(tree_level.indices >> ONE)
+            digests, _ = cls.hash_parents(tree_level, parents, default_nodes[level])
+            tree_level = TreeLevel(parents, bytearray(digests.tobytes()))
             tree.append(tree_level)
         return tree
 
+    @staticmethod
+    def hash_parents(tree_level, parents, default_node):
+        """
+        Hashes the nodes at the sorted `parents` indices from their children in
+        `tree_level`. Returns the (m, 32) digests of the parents that have at
+        least one non default child and the mask of those parents.
+        """
+        left, left_found = tree_level.lookup(parents << ONE, default_node)
+        right, right_found = tree_level.lookup((parents << ONE) | ONE, default_node)
+        keep = left_found | right_found
+        digests = keccak_pairs(left[keep].tobytes(), right[keep].tobytes())
+        return np.frombuffer(digests, dtype=np.uint8).reshape(-1, 32), keep
+
     def create_merkle_proof(self, uid):
         # Generate a merkle proof for a leaf with provided index.
         # First `depth/8` bytes of the proof are necessary for checking if
@@ -71,47 +677,207 @@ class SparseMerkleTree(object):
         proof = b''
         proofbits = 0
 
-        # Edge case of tree being empty
-        if len(self.tree) == 0:
-            return b'\x00\x00\x00\x00\x00\x00\x00\x00'
-
-        for level in range(self.depth):
+        # siblings below the split level of the leaves are default nodes
+        first_level = min(self.leaves.split_level(uid), self.depth)
+        index = uid >> first_level
+        for level in range(first_level, self.depth):
             sibling_index = index + 1 if index % 2 == 0 else index - 1
             index = index // 2
-            if sibling_index in self.tree[level]:
-                proof += self.tree[level][sibling_index]
+            digest = self.tree[level].node(sibling_index)
+            if digest is not None:
+                proof += digest
                 proofbits += 2 ** level
 
         proof_bytes = proofbits.to_bytes(8, byteorder='big')
         return proof_bytes + proof
 
+    def create_merkle_proofs(self, uids=None):
+        """
+        Generates the proofs of `uids`, all the leaves by default, in one pass.
+
+        Every level is looked up once for all the uids, siblings shared by
+        several uids are looked up once, and the proofs are written into a
+        preallocated buffer sliced through an offset table.
+        """
+        if uids is None:
+            uids = self.leaves.indices.copy()
+        else:
+            uids = np.unique(np.fromiter(uids, dtype=np.uint64))
+        count = len(uids)
+
+        index = uids
+        proofbits = np.zeros(count, dtype=np.uint64)
+        elements = np.zeros(count, dtype=np.int64)
+        lookups = []
+        for level in range(self.depth):
+            siblings, shared = np.unique(index ^ ONE, return_inverse=True)
+            positions, found = self.tree[level].find(siblings)
+            positions, found = positions[shared], found[shared]
+            proofbits |= found.astype(np.uint64) << np.uint64(level)
+            elements += found
+            lookups.append((positions, found))
+            index = index >> ONE
+
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(8 + 32 * elements, out=offsets[1:])
+        buffer = np.empty(offsets[-1], dtype=np.uint8)
+        starts = offsets[:-1]
+        buffer[starts[:, None] + np.arange(8)] = proofbits.astype('>u8').view(np.uint8).reshape(-1, 8)
+
+        written = starts + 8
+        for level, (positions, found) in enumerate(lookups):
+            rows = np.flatnonzero(found)
+            buffer[written[rows, None] + np.arange(32)] = self.tree[level].matrix()[positions[rows]]
+            written[rows] += 32
+        return MerkleProofs(uids, buffer.tobytes(), offsets.tolist())
+
+    def create_multiproof(self, uids):
+        """
+        Generates one proof for all of `uids`.
+
+        Layout: a little endian bitmap with one bit per sibling listed by
+        `multiproof_siblings`, set when the sibling is not a default node,
+        followed by the 32 byte hashes of the set bits in the same order.
+        Siblings shared by several uids, or computable from other uids, are
+        only included once.
+        """
+        bitmap = 0
+        slot = 0
+        proof = []
+        for level, siblings in multiproof_siblings(uids, self.depth):
+            positions, found = self.tree[level].find(siblings)
+            for position, present in zip(positions.tolist(), found.tolist()):
+                if present:
+                    bitmap |= 1 << slot
+                    proof.append(self.tree[level].digest(position))
+                slot += 1
+        return bitmap.to_bytes((slot + 7) // 8, byteorder='little') + b''.join(proof)
+
+    def verify_multiproof(self, uids, multiproof):
+        """ Checks if the multiproof for the leaves at `uids` is valid"""
+        # slots missing from the tree hold the empty leaf
+        leaves = {uid: self.leaves.get(uid, self.default_nodes[0]) for uid in uids}
+        return verify_multiproof(self.root, leaves, multiproof, self.depth)
+
     def verify(self, uid, proof):
         """ Checks if the proof for the leaf at `uid` is valid"""
         # assert (len(proof) -8 % 32) == 0
-        assert len(proof) <= 2056
-
-        proofbits = int.from_bytes((proof[0:8]), byteorder='big')
-        index = uid
-        p = 8
-        if index in self.leaves:
-            computed_hash = self.leaves[index]
+        if uid in self.leaves:
+            leaf = self.leaves[uid]
         # in case the tx is not included, computed_hash is the default leaf
         else:
-            computed_hash = self.default_nodes[-1]
+            leaf = self.default_nodes[-1]
+        return get_root(leaf, uid, proof, self.depth) == self.root
 
-        for d in range(self.depth):
-            if proofbits % 2 == 0:
-                proof_element = self.default_nodes[d]
-            else:
-                proof_element = proof[p: p + 32]
-                p += 32
-            if index % 2 == 0:
-                computed_hash = keccak(computed_hash + proof_element)
-            else:
-                computed_hash = keccak(proof_element + computed_hash)
-            proofbits = proofbits // 2
-            index = index // 2
-        return computed_hash == self.root
+    def node_digests(self, level, indices):
+        """ (n, 32) digests of the nodes at the sorted `indices` of `level`, default nodes included"""
+        return self.tree[level].lookup(indices, self.default_nodes[level])[0]
+
+    def diff(self, other):
+        """
+        Sorted uids of the leaves that differ between this tree and `other`,
+        added, removed or changed.
+
+        Both trees are walked down from the root together and only the
+        children whose hashes differ are expanded, so equal subtrees are
+        pruned at their top node and the walk costs O(changes * depth)
+        lookups instead of a scan of the leaves.
+        """
+        if other.depth != self.depth:
+            raise self.DepthMismatchException(
+                'cannot diff trees of depth {} and {}'.format(self.depth, other.depth)
+            )
+        if self.root == other.root:
+            return []
+
+        index = np.zeros(1, dtype=np.uint64)
+        for level in reversed(range(self.depth)):
+            children = np.stack([index << ONE, (index << ONE) | ONE], axis=1).ravel()
+            differs = (self.node_digests(level, children) != other.node_digests(level, children)).any(axis=1)
+            index = children[differs]
+        return index.tolist()
+
+    def set(self, uid, leaf_hash):
+        """ Sets the leaf at `uid` and returns the new root"""
+        return self.update({uid: leaf_hash})
+
+    def delete(self, uid):
+        """ Removes the leaf at `uid` and returns the new root"""
+        return self.update({uid: None})
+
+    def update(self, changes):
+        """
+        Applies a batch of leaf changes and returns the new root.
+
+        `changes` maps uids to leaf hashes, a value of None deletes the leaf.
+        Only the paths from the changed leaves up to the root are rehashed and
+        every ancestor shared by several changed leaves is hashed once, so k
+        changes cost about depth * k keccak calls instead of a full rebuild.
+        """
+        ordered = sorted(changes.items(), key=lambda t: t[0])
+        if len(ordered) <= SCALAR_UPDATE_MAX:
+            return self._update_nodes(ordered)
+        uids = np.array([uid for uid, _ in ordered], dtype=np.uint64)
+        keep = np.array([leaf_hash is not None for _, leaf_hash in ordered], dtype=bool)
+        digests = b''.join(leaf_hash for _, leaf_hash in ordered if leaf_hash is not None)
+        self.leaves.apply(uids, np.frombuffer(digests, dtype=np.uint8).reshape(-1, 32), keep)
+        self._check_size()
+
+        dirty = np.unique(uids >> ONE)
+        for level in range(self.depth):
+            digests, keep = self.hash_parents(self.tree[level], dirty, self.default_nodes[level])
+            # parents left without non default children become default nodes
+            self.tree[level + 1].apply(dirty, digests, keep)
+            dirty = np.unique(dirty >> ONE)
+
+        self.root = self.tree[-1].get(0, self.default_nodes[self.depth])
+        return self.root
+
+    def _update_nodes(self, ordered):
+        """ `update` of a few sorted changes, walking their paths node by node"""
+        for uid, leaf_hash in ordered:
+            self.leaves.put(uid, leaf_hash)
+        self._check_size()
+
+        dirty = sorted({uid >> 1 for uid, _ in ordered})
+        for level in range(self.depth):
+            tree_level, parent_level = self.tree[level], self.tree[level + 1]
+            default_node = self.default_nodes[level]
+            for parent in dirty:
+                left = tree_level.node(2 * parent)
+                right = tree_level.node(2 * parent + 1)
+                if left is None and right is None:
+                    parent_level.put(parent, None)
+                else:
+                    parent_level.put(parent, keccak((left or default_node) + (right or default_node)))
+            dirty = sorted({parent >> 1 for parent in dirty})
+
+        self.root = self.tree[-1].get(0, self.default_nodes[self.depth])
+        return self.root
+
+    def _check_size(self):
+        if len(self.leaves) > 2 ** self.depth:
+            raise self.TreeSizeExceededException(
+                'tree with depth {} cannot have {} leaves'.format(
+                    self.depth, len(self.leaves)
+                )
+            )
 
     class TreeSizeExceededException(Exception):
         """there are too many leaves for the tree to build"""
+
+    class SnapshotFormatException(Exception):
+        """the file is not a snapshot written by `save`"""
+
+    class ReadOnlyTreeException(Exception):
+        """snapshots can't be updated"""
+
+    class DepthMismatchException(Exception):
+        """only trees of the same depth can be compared"""
+
+
+class SparseMerkleTreeSnapshot(SparseMerkleTree):
+    """ Read only view returned by `SparseMerkleTree.snapshot`"""
+
+    def update(self, changes):
+        raise self.ReadOnlyTreeException('snapshot of root {} is read only'.format(self.root.hex()))
@@ -0,0 +1,141 @@
+import heapq
+import os
+import tempfile
+from itertools import islice
+
+from helpers.hasher import keccak
+from helpers.sparse_merkle_tree import default_nodes, fold
+
+# uid (8 bytes big endian, so byte order is numeric order) + leaf hash
+RECORD_SIZE = 40
+
+
+class StreamingRootBuilder(object):
+    """
+    Computes the root of a sparse merkle tree from leaves pushed in increasing
+    uid order without building the tree.
+
+    Only the right edge of the tree built so far is kept: at most one pending
+    node per level, so memory stays O(depth) whatever the number of leaves.
+    The root is the same as `SparseMerkleTree(depth, leaves).root`.
+    """
+
+    def __init__(self, depth=64):
+        self.depth = depth
+        self.default_nodes = default_nodes(depth)
+        # (level, index, hash) of the pending subtrees, sorted by position
+        self.frontier = []
+        self.last_uid = None
+
+    @staticmethod
+    def branch_level(left, right):
+        """ Level of the lowest common ancestor of two disjoint nodes"""
+        return ((left[1] << left[0]) ^ (right[1] << right[0])).bit_length()
+
+    def merge(self, left, right):
+        level = self.branch_level(left, right)
+        left_hash = fold(left[2], left[0], left[1], level - 1, self.depth)
+        right_hash = fold(right[2], right[0], right[1], level - 1, self.depth)
+        return level, left[1] >> (level - left[0]), keccak(left_hash + right_hash)
+
+    def push(self, uid, leaf_hash):
+        if self.last_uid is not None and uid <= self.last_uid:
+            raise self.UnsortedLeavesException(
+                'leaf {} pushed after leaf {}'.format(uid, self.last_uid)
+            )
+        self.last_uid = uid
+
+        node = (0, uid, leaf_hash)
+        frontier = self.frontier
+        # pending subtrees closer to each other than to the new leaf can't
+        # receive any more leaves, hash them together.
+        while len(frontier) >= 2 and \
+                self.branch_level(frontier[-2], frontier[-1]) < self.branch_level(frontier[-1], node):
+            right = frontier.pop()
+            frontier.append(self.merge(frontier.pop(), right))
+        frontier.append(node)
+
+    def extend(self, pairs):
+        for uid, leaf_hash in pairs:
+            self.push(uid, leaf_hash)
+        return self
+
+    @property
+    def root(self):
+        frontier = list(self.frontier)
+        if not frontier:
+            return self.default_nodes[self.depth]
+        while len(frontier) >= 2:
+            right = frontier.pop()
+            frontier.append(self.merge(frontier.pop(), right))
+        level, index, node_hash = frontier[0]
+        return fold(node_hash, level, index, self.depth, self.depth)
+
+    class UnsortedLeavesException(Exception):
+        """leaves must be pushed in strictly increasing uid order"""
+
+
+def _record(uid, leaf_hash):
+    # runs are read back in fixed size records, a shorter or longer hash
+    # would shift every record after it
+    if len(leaf_hash) != 32:
+        raise ValueError('leaf {} has a {} bytes hash, not 32'.format(uid, len(leaf_hash)))
+    return uid.to_bytes(8, byteorder='big') + leaf_hash
+
+
+def _write_run(run, tmp_dir):
+    run.sort()
+    fd, path = tempfile.mkstemp(prefix='smt-run-', dir=tmp_dir)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(b''.join(run))
+    return path
+
+
+def _read_run(path, chunk_records=4096):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(RECORD_SIZE * chunk_records)
+            if not chunk:
+                return
+            for offset in range(0, len(chunk), RECORD_SIZE):
+                yield chunk[offset: offset + RECORD_SIZE]
+
+
+def external_sort(pairs, run_size=1_000_000, tmp_dir=None):
+    """
+    Yields `(uid, hash)` pairs sorted by uid. Input is sorted in runs of
+    `run_size` pairs, runs are spilled to temporary files and merged back, so
+    memory is bounded by the run size rather than the input size.
+    """
+    pairs = iter(pairs)
+    paths = []
+    records = ()
+    try:
+        while True:
+            run = [_record(uid, leaf_hash) for uid, leaf_hash in islice(pairs, run_size)]
+            if not run:
+                break
+            if not paths and len(run) < run_size:
+                # everything fits in memory, no need to touch the disk
+                run.sort()
+                records = run
+                break
+            paths.append(_write_run(run, tmp_dir))
+        if paths:
+            records = heapq.merge(*[_read_run(path) for path in paths])
+
+        for record in records:
+            yield int.from_bytes(record[:8], byteorder='big'), record[8:]
+    finally:
+        for path in paths:
+            os.remove(path)
+
+
+def stream_root(pairs, depth=64, presorted=True, run_size=1_000_000, tmp_dir=None):
+    """
+    Root of the sparse merkle tree holding the `(uid, hash)` pairs, computed in
+    O(depth) memory. Unsorted input goes through `external_sort` first.
+    """
+    if not presorted:
+        pairs = external_sort(pairs, run_size, tmp_dir)
+    return StreamingRootBuilder(depth).extend(pairs).root
@@ -0,0 +1,13 @@
+from collections import namedtuple
+
+
+class Throughput(namedtuple('Throughput', ['count', 'seconds'])):
+    """ Number of items processed and the wall clock seconds it took"""
+    __slots__ = ()
+
+    @property
+    def per_second(self):
+        return self.count / self.seconds if self.seconds else float('inf')
+
+    def __str__(self):
+        return '{} items in {:.3f}s ({:.0f}/s)'.format(self.count, self.seconds, self.per_second)
@@ -0,0 +1,132 @@
+from helpers.hasher import keccak
+
+
+def _encode_length(length, offset):
+    if length < 56:
+        return bytes([offset + length])
+    length_bytes = length.to_bytes((length.bit_length() + 7) // 8, byteorder='big')
+    return bytes([offset + 55 + len(length_bytes)]) + length_bytes
+
+
+def _encode_uint(value):
+    if value == 0:
+        return b'\x80'
+    if value < 128:
+        return bytes([value])
+    value_bytes = value.to_bytes((value.bit_length() + 7) // 8, byteorder='big')
+    return _encode_length(len(value_bytes), 0x80) + value_bytes
+
+
+def _decode_item(data, offset):
+    """ Returns the (start, end) of the payload of the RLP item at `offset` and its list flag"""
+    if offset >= len(data):
+        raise PlasmaTransaction.InvalidTransactionException('missing RLP item at {}'.format(offset))
+    prefix = data[offset]
+    if prefix < 0x80:
+        return offset, offset + 1, False
+    if prefix < 0xc0:
+        is_list, short, base = False, 0x80, 0xb7
+    else:
+        is_list, short, base = True, 0xc0, 0xf7
+    if prefix <= base:
+        start = offset + 1
+        end = start + prefix - short
+    else:
+        length_size = prefix - base
+        start = offset + 1 + length_size
+        end = start + int.from_bytes(data[offset + 1: start], byteorder='big')
+    if end > len(data):
+        raise PlasmaTransaction.InvalidTransactionException('truncated RLP item at {}'.format(offset))
+    return start, end, is_list
+
+
+class PlasmaTransaction(object):
+    """
+    Off-chain transfer of the coin at `slot`, as decoded by `Transaction.sol::getTx`.
+
+    Instances are immutable. The RLP encoding and the hash are computed on
+    first use and cached; a transaction decoded with `from_bytes` keeps the
+    bytes it was decoded from as its encoding.
+    """
+    __slots__ = ('slot', 'prev_block', 'denomination', 'owner', '_encoded', '_hash')
+
+    def __init__(self, slot, prev_block, denomination, owner, encoded=None):
+        if isinstance(owner, str):
+            owner = bytes.fromhex(owner[2:] if owner.startswith('0x') else owner)
+        if len(owner) != 20:
+            raise self.InvalidTransactionException('owner must be a 20 bytes address')
+        set_slot = object.__setattr__
+        set_slot(self, 'slot', slot)
+        set_slot(self, 'prev_block', prev_block)
+        set_slot(self, 'denomination', denomination)
+        set_slot(self, 'owner', bytes(owner))
+        set_slot(self, '_encoded', encoded)
+        set_slot(self, '_hash', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('PlasmaTransaction is immutable')
+
+    @classmethod
+    def from_bytes(cls, tx_bytes):
+        """ Decodes the RLP list [slot, prevBlock, denomination, owner]"""
+        start, end, is_list = _decode_item(tx_bytes, 0)
+        if not is_list or end != len(tx_bytes):
+            raise cls.InvalidTransactionException('transaction must be a single RLP list')
+        fields = []
+        offset = start
+        while offset < end:
+            item_start, item_end, is_list = _decode_item(tx_bytes, offset)
+            if is_list:
+                raise cls.InvalidTransactionException('nested list at {}'.format(offset))
+            fields.append(tx_bytes[item_start: item_end])
+            offset = item_end
+        if len(fields) != 4:
+            raise cls.InvalidTransactionException('transaction has {} fields instead of 4'.format(len(fields)))
+        slot, prev_block, denomination = (int.from_bytes(field, byteorder='big') for field in fields[:3])
+        return cls(slot, prev_block, denomination, fields[3], encoded=tx_bytes)
+
+    def to_bytes(self):
+        encoded = self._encoded
+        if encoded is None:
+            payload = _encode_uint(self.slot) + _encode_uint(self.prev_block) + \
+                _encode_uint(self.denomination) + b'\x94' + self.owner
+            encoded = _encode_length(len(payload), 0xc0) + payload
+            object.__setattr__(self, '_encoded', encoded)
+        return encoded
+
+    @property
+    def is_deposit(self):
+        return self.prev_block == 0
+
+    @property
+    def hash(self):
+        """ keccak256 of the uint64 slot for deposits, of the RLP bytes otherwise"""
+        tx_hash = self._hash
+        if tx_hash is None:
+            if self.is_deposit:
+                tx_hash = keccak(self.slot.to_bytes(8, byteorder='big'))
+            else:
+                tx_hash = keccak(bytes(self.to_bytes()))
+            object.__setattr__(self, '_hash', tx_hash)
+        return tx_hash
+
+    def sign(self, signer):
+        """ Signature of the transaction hash by a `helpers.signer` signer"""
+        return signer.sign(self.hash)
+
+    def __eq__(self, other):
+        if not isinstance(other, PlasmaTransaction):
+            return NotImplemented
+        return (self.slot, self.prev_block, self.denomination, self.owner) == \
+            (other.slot, other.prev_block, other.denomination, other.owner)
+
+    def __hash__(self):
+        return hash((self.slot, self.prev_block, self.denomination, self.owner))
+
+    def __repr__(self):
+        return 'PlasmaTransaction(slot={}, prev_block={}, denomination={}, owner={})'.format(
+            self.slot, self.prev_block, self.denomination, '0x' + self.owner.hex()
+        )
+
+    class InvalidTransactionException(Exception):
+        """the bytes are not an RLP encoded plasma transaction"""
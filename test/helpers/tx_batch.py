@@ -0,0 +1,259 @@
+import mmap
+import struct
+
+import numpy as np
+
+from helpers.hasher import keccak_many
+from helpers.sparse_merkle_tree import PAGE_SIZE
+from helpers.transaction import PlasmaTransaction
+
+# one fixed width record per transaction. Integers wider than 64 bits are
+# kept as 32 byte big endian words, the way the EVM sees them.
+TX_DTYPE = np.dtype([
+    ('slot', '<u8'),
+    ('prev_block', '<u8'),
+    ('denomination', 'u1', (32,)),
+    ('owner', 'u1', (20,)),
+    ('signature', 'u1', (65,)),
+])
+
+# batch file: a header page with the magic, format version and record count,
+# then the records from the next page boundary so they can be used straight
+# from a mmap.
+BATCH_MAGIC = b'PLASMTXB'
+BATCH_VERSION = 1
+BATCH_HEADER = struct.Struct('<8sIQ')
+OWNER_PREFIX = 0x80 + 20
+
+
+def _big_endian(column):
+    """ (n, 8) big endian bytes of a uint64 column"""
+    return np.ascontiguousarray(column, dtype='>u8').view(np.uint8).reshape(-1, 8)
+
+
+def _uint_sizes(matrix):
+    """
+    RLP layout of the big endian integers in the rows of `matrix`: the index
+    of their first significant byte, whether they are encoded as a single
+    byte, and the size of their encoding.
+    """
+    width = matrix.shape[1]
+    nonzero = matrix != 0
+    first = np.where(nonzero.any(axis=1), nonzero.argmax(axis=1), width)
+    length = width - first
+    lead = matrix[np.arange(len(matrix)), np.minimum(first, width - 1)]
+    single = (length == 1) & (lead < 0x80)
+    return first, single, np.where(single, 1, 1 + length)
+
+
+def _write_uint(out, at, matrix, first, single):
+    width = matrix.shape[1]
+    prefixed = ~single
+    out[at[prefixed]] = 0x80 + width - first[prefixed]
+    data = at + prefixed
+    for column in range(width):
+        rows = first <= column
+        out[data[rows] + column - first[rows]] = matrix[rows, column]
+
+
+def _read_uint(buf, pos, width, valid):
+    """
+    Reads the RLP integers at `pos`, up to `width` bytes, into an (n, width)
+    big endian matrix. Returns it with the positions after the items, rows
+    that can't be decoded are cleared in `valid`.
+    """
+    last = len(buf) - 1
+    prefix = buf[np.minimum(pos, last)].astype(np.int64)
+    single = prefix < 0x80
+    length = np.where(single, 1, prefix - 0x80)
+    valid &= single | (prefix <= 0x80 + width)
+    length = np.where(valid, length, 0)
+    data = pos + ~single
+
+    matrix = np.zeros((len(pos), width), dtype=np.uint8)
+    for i in range(width):
+        rows = i < length
+        matrix[rows, width - length[rows] + i] = buf[np.minimum(data[rows] + i, last)]
+    return matrix, data + length
+
+
+class TransactionBatch(object):
+    """
+    Signed plasma transactions stored column wise in a numpy structured array
+    of `TX_DTYPE` records.
+
+    Batches convert from and to the RLP `Transaction.sol` decodes with every
+    field of every transaction handled at once, and are written to and mapped
+    from files, or sent as bytes, without any parsing.
+    """
+    __slots__ = ('records',)
+
+    def __init__(self, records=None):
+        self.records = np.zeros(0, dtype=TX_DTYPE) if records is None else records
+
+    @classmethod
+    def from_transactions(cls, txs, signatures=None):
+        """ Batch of `PlasmaTransaction`s and their signatures, if any"""
+        txs = list(txs)
+        records = np.zeros(len(txs), dtype=TX_DTYPE)
+        for name, field, bits in (('slot', 'slot', 64), ('prevBlock', 'prev_block', 64), ('denomination', 'denomination', 256)):
+            values = [getattr(tx, field) for tx in txs]
+            if values and not (min(values) >= 0 and max(values) < 2 ** bits):
+                raise PlasmaTransaction.InvalidTransactionException('{} does not fit in {} bits'.format(name, bits))
+        records['slot'] = [tx.slot for tx in txs]
+        records['prev_block'] = [tx.prev_block for tx in txs]
+        records['denomination'] = np.frombuffer(
+            b''.join(tx.denomination.to_bytes(32, byteorder='big') for tx in txs), dtype=np.uint8
+        ).reshape(-1, 32)
+        records['owner'] = np.frombuffer(b''.join(tx.owner for tx in txs), dtype=np.uint8).reshape(-1, 20)
+        if signatures is not None:
+            records['signature'] = np.frombuffer(
+                b''.join(bytes(signature) for signature in signatures), dtype=np.uint8
+            ).reshape(-1, 65)
+        return cls(records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, position):
+        record = self.records[position]
+        return PlasmaTransaction(
+            int(record['slot']),
+            int(record['prev_block']),
+            int.from_bytes(record['denomination'].tobytes(), byteorder='big'),
+            record['owner'].tobytes(),
+        )
+
+    def transactions(self):
+        return [self[position] for position in range(len(self))]
+
+    def signatures(self):
+        return [record.tobytes() for record in self.records['signature']]
+
+    def encode(self):
+        """
+        RLP encodes every transaction into one buffer. Returns the buffer and
+        the offsets of the transactions in it, transaction i being
+        `buffer[offsets[i]: offsets[i + 1]]`.
+        """
+        count = len(self.records)
+        fields = [
+            _big_endian(self.records['slot']),
+            _big_endian(self.records['prev_block']),
+            np.ascontiguousarray(self.records['denomination']),
+        ]
+        layouts = [_uint_sizes(matrix) for matrix in fields]
+        payload = sum(size for _, _, size in layouts) + 21
+        # the payload is at most 9 + 9 + 33 + 21 bytes, one length byte at most
+        header = np.where(payload < 56, 1, 2)
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(header + payload, out=offsets[1:])
+        starts = offsets[:-1]
+
+        out = np.empty(offsets[-1], dtype=np.uint8)
+        out[starts] = np.where(payload < 56, 0xc0 + payload, 0xf8)
+        long_lists = payload >= 56
+        out[starts[long_lists] + 1] = payload[long_lists]
+        at = starts + header
+        for matrix, (first, single, size) in zip(fields, layouts):
+            _write_uint(out, at, matrix, first, single)
+            at = at + size
+        out[at] = OWNER_PREFIX
+        out[(at + 1)[:, None] + np.arange(20)] = self.records['owner']
+        return out.tobytes(), offsets
+
+    def to_rlp(self):
+        """ RLP encoding of every transaction"""
+        buffer, offsets = self.encode()
+        offsets = offsets.tolist()
+        return [buffer[start: end] for start, end in zip(offsets, offsets[1:])]
+
+    @classmethod
+    def decode(cls, buffer, offsets, signatures=None):
+        """
+        Decodes the RLP transactions packed in `buffer` at `offsets`, the
+        inverse of `encode`. Transactions whose prevBlock doesn't fit in 64
+        bits are rejected.
+        """
+        buf = np.frombuffer(buffer, dtype=np.uint8)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        starts, ends = offsets[:-1], offsets[1:]
+        if not len(buf):
+            # reads below need a byte to clip to, every transaction is empty and rejected
+            buf = np.zeros(1, dtype=np.uint8)
+        last = len(buf) - 1
+
+        valid = ends > starts
+        prefix = buf[np.clip(starts, 0, last)].astype(np.int64)
+        long_list = prefix == 0xf8
+        valid &= (prefix >= 0xc0) & (prefix <= 0xf8)
+        payload = np.where(long_list, buf[np.clip(starts + 1, 0, last)], prefix - 0xc0)
+        pos = starts + 1 + long_list
+        valid &= pos + payload == ends
+
+        slot, pos = _read_uint(buf, pos, 8, valid)
+        prev_block, pos = _read_uint(buf, pos, 8, valid)
+        denomination, pos = _read_uint(buf, pos, 32, valid)
+        valid &= buf[np.clip(pos, 0, last)] == OWNER_PREFIX
+        owner = buf[np.clip((pos + 1)[:, None] + np.arange(20), 0, last)]
+        valid &= pos + 21 == ends
+
+        if not valid.all():
+            raise PlasmaTransaction.InvalidTransactionException(
+                'invalid transactions at {}'.format(np.flatnonzero(~valid).tolist())
+            )
+        records = np.zeros(len(starts), dtype=TX_DTYPE)
+        records['slot'] = slot.view('>u8').ravel()
+        records['prev_block'] = prev_block.view('>u8').ravel()
+        records['denomination'] = denomination
+        records['owner'] = owner
+        if signatures is not None:
+            records['signature'] = np.frombuffer(
+                b''.join(bytes(signature) for signature in signatures), dtype=np.uint8
+            ).reshape(-1, 65)
+        return cls(records)
+
+    @classmethod
+    def from_rlp(cls, txs_bytes, signatures=None):
+        """ Decodes a list of RLP encoded transactions"""
+        offsets = np.zeros(len(txs_bytes) + 1, dtype=np.int64)
+        np.cumsum([len(tx_bytes) for tx_bytes in txs_bytes], out=offsets[1:])
+        return cls.decode(b''.join(txs_bytes), offsets, signatures)
+
+    def hashes(self):
+        """ Hash of every transaction, following `Transaction.sol::getTx`"""
+        buffer, offsets = self.encode()
+        offsets = offsets.tolist()
+        slots = _big_endian(self.records['slot']).tobytes()
+        deposits = (self.records['prev_block'] == 0).tolist()
+        return keccak_many(
+            slots[8 * i: 8 * i + 8] if deposit else buffer[offsets[i]: offsets[i + 1]]
+            for i, deposit in enumerate(deposits)
+        )
+
+    def to_bytes(self):
+        """ Batch file contents, see `load`"""
+        header = BATCH_HEADER.pack(BATCH_MAGIC, BATCH_VERSION, len(self.records))
+        return header + b'\x00' * (PAGE_SIZE - len(header)) + self.records.tobytes()
+
+    @classmethod
+    def from_bytes(cls, buffer):
+        """ Batch on top of `buffer`, records are a view on it, nothing is copied"""
+        magic, version, count = BATCH_HEADER.unpack_from(buffer)
+        if magic != BATCH_MAGIC or version != BATCH_VERSION:
+            raise cls.BatchFormatException('not a version {} transaction batch'.format(BATCH_VERSION))
+        return cls(np.frombuffer(buffer, dtype=TX_DTYPE, count=count, offset=PAGE_SIZE))
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        """ Maps a batch written by `save`, records are read only views on the file"""
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls.from_bytes(mapped)
+
+    class BatchFormatException(Exception):
+        """the buffer is not a batch written by `to_bytes`"""
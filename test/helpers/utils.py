@@ -2,7 +2,6 @@ import random
 from typing import Dict, List, Tuple
 
 import requests
-import rlp
 from eth_account import Account
 from hexbytes import HexBytes
 from requests import Response
@@ -11,7 +10,9 @@ from helpers.const import (COIN_DENOMINATION, DEFAULT_FROM,
                            DEFAULT_PARITY_NODE_URL, DEFAULT_PASSWORD,
                            ETHER_ALLOC, ETHER_NAME, TOKEN_ALLOC)
 from helpers.const import W3 as w3
+from helpers.signer import RpcSigner, local_signer, register
 from helpers.sparse_merkle_tree import SparseMerkleTree
+from helpers.transaction import PlasmaTransaction
 
 
 def participate(deployed_contracts, address, nr_of_tokens, denomination):
@@ -97,11 +98,9 @@ def generate_dummy_tx() -> List:
     deno = 20
     owner = bytes.fromhex("30e3862ceb1a9b8b227bd2a53948c2ba2f1aa54a")
 
-    tx = rlp.encode([uid, prevBlock, deno, owner])
+    tx = PlasmaTransaction(uid, prevBlock, deno, owner)
 
-    tx_hash = HexBytes(
-        w3.soliditySha3(['bytes'], [tx])  # dummy hash(leaf)
-    )
+    tx_hash = HexBytes(tx.hash)  # dummy hash(leaf)
 
     tx = [uid, tx_hash]
 
@@ -119,35 +118,27 @@ def generate_tx(token_id, prev_block, denomination, addr_to, addr_from) -> Dict:
     :param addr_from: address that initiates the transaction
     :return: Dictionary with signature and rlp encoded transaction.
     """
-    tx = rlp.encode([token_id, prev_block, denomination, bytes.fromhex(addr_to[2:])])
-
-    if prev_block == 0:
-        # This is a deposit transaction.
-        # the kecca256 of token id since this is a deposit.
-        tx_hash = w3.soliditySha3(['uint64'], [token_id])
-
-        w3.personal.unlockAccount(addr_from, DEFAULT_PASSWORD)
-        signature = w3.eth.sign(addr_from, data=tx_hash)
-        tx = {
+    tx = PlasmaTransaction(token_id, prev_block, denomination, addr_to)
+    # accounts created by `generate_parity_accounts` sign in process, the
+    # others go through the node.
+    signer = local_signer(addr_from) or RpcSigner(w3, addr_from, DEFAULT_PASSWORD)
+    signature = tx.sign(signer)
+
+    if tx.is_deposit:
+        # This is a deposit transaction, its hash is the kecca256 of the token id.
+        return {
             "signature": signature,
-            "tx": tx
+            "tx": tx.to_bytes()
         }
-        return tx
 
     else:
-        # Else the token was transferred before off-chain.
-
-        # the hash of the tx encoded bytes.
-        tx_hash = w3.soliditySha3(['bytes'], [tx])
-
-        w3.personal.unlockAccount(addr_from, DEFAULT_PASSWORD)
-        signature = w3.eth.sign(addr_from, data=tx_hash)
-        tx = {
+        # Else the token was transferred before off-chain, its hash is the hash
+        # of the tx encoded bytes.
+        return {
             "signature": signature,
-            "tx": tx,
-            "tx_hash": tx_hash
+            "tx": tx.to_bytes(),
+            "tx_hash": HexBytes(tx.hash)
         }
-        return tx
 
 
 def generate_block(plasma_instance, token_id, tx_hash, block_number) -> Tuple:
@@ -198,6 +189,8 @@ def generate_parity_accounts(amount: int, password: str = DEFAULT_PASSWORD) -> L
     accounts = []
     for i in range(0, amount):
         acct = Account.create(password)
+        # keep the key so transactions of this account are signed locally
+        register(acct.privateKey)
         if w3.version.node.startswith('Parity'):
             # create a new parity account from a private key.
             payload = {
@@ -0,0 +1,144 @@
+from bisect import bisect_left, bisect_right
+
+from helpers.compressed_sparse_merkle_tree import CompressedSparseMerkleTree
+
+
+class ExclusionProofs(object):
+    """
+    Exclusion proofs of slots over a range of blocks in run length form.
+
+    `proofs` holds every distinct proof once, `runs[uid]` is a list of
+    (first block, last block, proof id) sorted by block: the slot is excluded
+    from every committed block between the two with `proofs[proof id]` as
+    proof. Blocks including the slot fall between runs. `blocks` are the
+    committed blocks of the range, the only ones with proofs.
+    """
+    __slots__ = ('proofs', 'runs', 'blocks')
+
+    def __init__(self, blocks=()):
+        self.proofs = []
+        self.runs = {}
+        self.blocks = list(blocks)
+
+    def proof(self, uid, block_number):
+        """
+        Exclusion proof of `uid` in `block_number`, None if the slot is
+        included or `block_number` isn't a committed block of the range
+        """
+        position = bisect_left(self.blocks, block_number)
+        if position == len(self.blocks) or self.blocks[position] != block_number:
+            return None
+        runs = self.runs.get(uid, [])
+        position = bisect_right(runs, (block_number, float('inf'))) - 1
+        if position < 0 or runs[position][1] < block_number:
+            return None
+        return self.proofs[runs[position][2]]
+
+    def __iter__(self):
+        """ Yields (uid, first block, last block, proof) for every run"""
+        for uid, runs in self.runs.items():
+            for first_block, last_block, proof_id in runs:
+                yield uid, first_block, last_block, self.proofs[proof_id]
+
+    def __len__(self):
+        return sum(map(len, self.runs.values()))
+
+
+class VersionedSparseMerkleTree(object):
+    """
+    Sparse merkle trees of consecutive plasma blocks.
+
+    Every sealed block is an immutable version of a compressed tree built by
+    applying that block's changes to the previous version. Nodes are never
+    mutated, so versions share every subtree the changes didn't touch, and
+    nodes go through a hash-consed store so a subtree that comes back to an
+    earlier state is shared as well. Memory grows with the number of changes,
+    not with blocks * leaves.
+    """
+
+    def __init__(self, depth=64):
+        self.depth = depth
+        self.store = {}
+        self.tree = CompressedSparseMerkleTree(depth, store=self.store)
+        # block number -> (top node, root)
+        self.versions = {}
+        self.blocks = []
+
+    def commit(self, block_number, changes):
+        """
+        Seals `block_number` as the latest version: `changes`, a uid -> leaf hash
+        mapping where None deletes the leaf, applied to the previous version.
+        Returns the root of the block.
+        """
+        if self.blocks and block_number <= self.blocks[-1]:
+            raise self.BlockOrderException(
+                'block {} committed after block {}'.format(block_number, self.blocks[-1])
+            )
+        root = self.tree.update(changes)
+        self.versions[block_number] = (self.tree.top, root)
+        self.blocks.append(block_number)
+        return root
+
+    def commit_leaves(self, block_number, leaves):
+        """ Seals `block_number` as the tree of exactly `leaves`"""
+        previous = self.tree.leaves
+        changes = {uid: None for uid in previous if uid not in leaves}
+        changes.update({uid: leaf_hash for uid, leaf_hash in leaves.items() if previous.get(uid) != leaf_hash})
+        return self.commit(block_number, changes)
+
+    def at(self, block_number):
+        """ Read only compressed tree of `block_number`, sharing the version's nodes"""
+        top, _ = self.versions[block_number]
+        return CompressedSparseMerkleTree.from_top(top, self.depth)
+
+    def root_at(self, block_number):
+        return self.versions[block_number][1]
+
+    def proof_at(self, block_number, uid):
+        """ Proof of `uid` in `block_number`, in the `SparseMerkleTree` layout"""
+        return self.at(block_number).create_merkle_proof(uid)
+
+    def leaf_at(self, block_number, uid):
+        return self.at(block_number).get(uid)
+
+    def exclusion_proofs(self, uids, first_block, last_block):
+        """
+        Exclusion proofs of every slot of `uids` in every committed block from
+        `first_block` to `last_block` included, as `ExclusionProofs`.
+
+        Versions are walked in order and a proof is only computed when the
+        version's tree changed, by walking the compressed path of the slot.
+        Consecutive blocks with the same proof extend the same run, equal
+        proofs are stored once whatever the slot or block.
+        """
+        blocks = self.blocks[bisect_left(self.blocks, first_block): bisect_right(self.blocks, last_block)]
+        result = ExclusionProofs(blocks)
+        proof_ids = {}
+        for uid in uids:
+            runs = result.runs.setdefault(uid, [])
+            run = None
+            previous_top = proof_id = None
+            for block_number in blocks:
+                top, _ = self.versions[block_number]
+                if run is None or top is not previous_top:
+                    tree = CompressedSparseMerkleTree.from_top(top, self.depth)
+                    if tree.get(uid) is not None:
+                        # the slot is part of this block, close the run
+                        run = None
+                        previous_top = top
+                        continue
+                    proof = tree.create_merkle_proof(uid)
+                    proof_id = proof_ids.setdefault(proof, len(result.proofs))
+                    if proof_id == len(result.proofs):
+                        result.proofs.append(proof)
+                    previous_top = top
+                if run is not None and run[2] == proof_id:
+                    run[1] = block_number
+                else:
+                    run = [block_number, block_number, proof_id]
+                    runs.append(run)
+            result.runs[uid] = [tuple(r) for r in runs]
+        return result
+
+    class BlockOrderException(Exception):
+        """blocks must be committed in increasing block number order"""
@@ -0,0 +1,131 @@
+import os
+import random
+
+import numpy as np
+import pytest
+
+from helpers.admission import (ACCEPTED, DENOMINATION_MISMATCH, DUPLICATE_SLOT,
+                               NOT_OWNER, NOT_TRANSFERABLE,
+                               PREV_BLOCK_MISMATCH, UNKNOWN_SLOT,
+                               AdmissionValidator)
+from helpers.block_builder import BlockBuilder
+from helpers.coin_state import (EXITING, NOT_EXITING, WITHDRAWN,
+                                CoinStateIndex)
+from helpers.signature_verifier import SignatureVerifier
+from helpers.signer import LocalSigner
+from helpers.transaction import PlasmaTransaction
+from helpers.tx_batch import TransactionBatch
+
+
+def test_index_lookups_and_growth():
+    '''
+        the index finds every coin after growing past its initial capacity and keeps the last update
+    '''
+    index = CoinStateIndex(capacity=4)
+    slots = [random.getrandbits(64) for _ in range(5_000)]
+    owners = ['0x' + os.urandom(20).hex() for _ in range(3)]
+    index.upsert(slots, [owners[i % 3] for i in range(len(slots))], [1_000] * len(slots), [20] * len(slots))
+    index.upsert(slots[:10], [owners[0]] * 10, [2_000] * 10, [20] * 10)
+
+    assert len(index) == len(set(slots))
+    assert (index.find(slots) >= 0).all()
+    assert (index.find([random.getrandbits(64) for _ in range(100)]) < 0).sum() >= 99
+    assert index.get(slots[0])[:3] == (owners[0], 2_000, 20)
+    assert index.get(slots[20]) == (owners[20 % 3], 1_000, 20, 1_000, NOT_EXITING)
+    assert len(index.owners) == 3
+
+
+def test_admission_reason_codes():
+    '''
+        each broken rule gets its own reason code, valid transfers are accepted
+    '''
+    alice = LocalSigner(os.urandom(32))
+    bob = LocalSigner(os.urandom(32))
+    slots = [random.getrandbits(64) for _ in range(6)]
+    index = CoinStateIndex()
+    index.upsert(slots, [alice.address] * 6, [3_000] * 6, [20] * 6)
+    index.set_state(slots[5], EXITING)
+
+    txs = [
+        PlasmaTransaction(slots[0], 3_000, 20, bob.address),
+        PlasmaTransaction(slots[1], 2_000, 20, bob.address),
+        PlasmaTransaction(slots[2], 3_000, 30, bob.address),
+        PlasmaTransaction(slots[3], 3_000, 20, bob.address),
+        PlasmaTransaction(random.getrandbits(64), 3_000, 20, bob.address),
+        PlasmaTransaction(slots[0], 3_000, 20, alice.address),
+        PlasmaTransaction(slots[5], 3_000, 20, bob.address),
+    ]
+    signers = [alice, alice, alice, bob, alice, alice, alice]
+    signatures = [signer.sign(tx.hash) for signer, tx in zip(signers, txs)]
+    batch = TransactionBatch.from_transactions(txs, signatures)
+
+    validator = AdmissionValidator(index, SignatureVerifier(workers=1))
+    reasons, throughput = validator.validate(batch)
+    assert reasons.tolist() == [
+        ACCEPTED, PREV_BLOCK_MISMATCH, DENOMINATION_MISMATCH, NOT_OWNER, UNKNOWN_SLOT, DUPLICATE_SLOT,
+        NOT_TRANSFERABLE
+    ]
+    assert throughput.count == len(txs)
+    assert np.array_equal(validator.validate(batch, [signer.address.lower() for signer in signers])[0], reasons)
+
+
+def test_index_follows_events_and_blocks():
+    '''
+        deposits, exits and sealed transfers keep the index in sync with the chain
+    '''
+    alice = '0x' + os.urandom(20).hex()
+    bob = '0x' + os.urandom(20).hex()
+    slots = [random.getrandbits(64) for _ in range(3)]
+    events = [
+        {'event': 'Deposit', 'args': {'slot': slot, 'blockNumber': i + 1, 'denomination': 20, 'from': alice}}
+        for i, slot in enumerate(slots)
+    ]
+    index = CoinStateIndex()
+    index.ingest_events(events)
+    assert index.get(slots[1]) == (alice, 2, 20, 2, NOT_EXITING)
+
+    builder = BlockBuilder()
+    builder.add(PlasmaTransaction(slots[0], 1, 20, bob))
+    builder.add(PlasmaTransaction(slots[1], 2, 20, bob))
+    assert index.ingest_block(builder.seal()).all()
+    assert index.get(slots[0]) == (bob, 1_000, 20, 1, NOT_EXITING)
+
+    index.ingest_events([
+        {'event': 'StartedExit', 'args': {'slot': slots[0], 'owner': bob}},
+        {'event': 'StartedExit', 'args': {'slot': slots[1], 'owner': bob}},
+        {'event': 'CoinReset', 'args': {'slot': slots[1], 'owner': bob}},
+        {'event': 'StartedExit', 'args': {'slot': slots[2], 'owner': bob}},
+        {'event': 'FinalizedExit', 'args': {'slot': slots[2], 'owner': bob}},
+        {'event': 'Withdrew', 'args': {'slot': slots[2], 'owner': bob, 'uid': 0, 'denomination': 20}},
+    ])
+    assert [index.get(slot).state for slot in slots] == [EXITING, NOT_EXITING, WITHDRAWN]
+    assert index.get(slots[2]).owner == bob
+
+
+def test_invalid_transfer_does_not_take_the_slot():
+    '''
+        a forged transfer ahead of the owner's one is rejected without getting the owner's one rejected
+    '''
+    alice = LocalSigner(os.urandom(32))
+    mallory = LocalSigner(os.urandom(32))
+    slot = random.getrandbits(64)
+    index = CoinStateIndex()
+    index.upsert([slot], [alice.address], [3_000], [20])
+
+    txs = [
+        PlasmaTransaction(slot, 3_000, 20, mallory.address),
+        PlasmaTransaction(slot, 3_000, 20, '0x' + os.urandom(20).hex()),
+        PlasmaTransaction(slot, 3_000, 20, alice.address),
+    ]
+    signers = [mallory.address, alice.address, alice.address]
+    reasons, _ = AdmissionValidator(index).validate(TransactionBatch.from_transactions(txs), signers)
+    assert reasons.tolist() == [NOT_OWNER, ACCEPTED, DUPLICATE_SLOT]
+
+
+def test_validator_without_verifier_needs_signers():
+    '''
+        a validator without a verifier can't recover the signers itself
+    '''
+    batch = TransactionBatch.from_transactions([PlasmaTransaction(random.getrandbits(64), 1, 20, os.urandom(20))])
+    with pytest.raises(ValueError):
+        AdmissionValidator(CoinStateIndex()).validate(batch)
@@ -0,0 +1,80 @@
+import os
+import random
+
+import pytest
+
+from helpers.block_builder import BlockBuilder, Mempool
+from helpers.sparse_merkle_tree import get_root
+from helpers.transaction import PlasmaTransaction
+
+
+def random_transfer(slot=None):
+    '''
+        transfer of a random or given slot to a random owner
+    '''
+    slot = random.getrandbits(64) if slot is None else slot
+    return PlasmaTransaction(slot, 1000, 1, os.urandom(20))
+
+
+def test_seal_builds_tree_proofs_and_submits():
+    '''
+        a sealed block holds a proof for every slot and its root is handed to the submitter
+    '''
+    submitted = []
+    builder = BlockBuilder(submitter=lambda block_number, root: submitted.append((block_number, root)))
+    txs = [random_transfer() for _ in range(5_000)]
+    for tx in txs:
+        builder.add(tx, os.urandom(65))
+
+    block = builder.seal()
+    assert submitted == [(1000, block.root)]
+    assert block.throughput.count == len(txs) == len(block.proofs)
+    for tx in random.sample(txs, 20):
+        assert get_root(tx.hash, tx.slot, block.proofs[tx.slot]) == block.root
+    assert len(builder.mempool) == 0
+
+    assert builder.seal().number == 2000
+    with pytest.raises(BlockBuilder.BlockOrderException):
+        builder.seal(1500)
+
+
+def test_failed_submission_keeps_the_transfers():
+    '''
+        a block whose submission fails leaves its transfers pooled and its number unused
+    '''
+    def failing_submitter(block_number, root):
+        raise ConnectionError('node unreachable')
+
+    builder = BlockBuilder(submitter=failing_submitter)
+    txs = [random_transfer() for _ in range(10)]
+    for tx in txs:
+        builder.add(tx)
+    with pytest.raises(ConnectionError):
+        builder.seal()
+    assert len(builder.mempool) == len(txs)
+
+    builder.submitter = None
+    block = builder.seal()
+    assert block.number == 1000
+    assert set(block.transfers) == {tx.slot for tx in txs}
+
+
+def test_mempool_rules():
+    '''
+        one transfer per slot per block, and a transaction is only accepted once per block
+    '''
+    mempool = Mempool()
+    tx = random_transfer()
+    mempool.add(tx)
+    with pytest.raises(Mempool.SlotTakenException):
+        mempool.add(random_transfer(tx.slot))
+    with pytest.raises(Mempool.DuplicateTransactionException):
+        mempool.add(PlasmaTransaction(tx.slot, tx.prev_block, tx.denomination, tx.owner))
+
+    # sealed hashes are forgotten, replays are rejected by admission
+    mempool.drain()
+    assert not mempool.seen
+    other = random_transfer(tx.slot)
+    mempool.add(other)
+    with pytest.raises(Mempool.DuplicateTransactionException):
+        mempool.add(other)
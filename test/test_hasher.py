@@ -0,0 +1,60 @@
+import os
+
+import pytest
+from eth_utils.crypto import keccak as eth_utils_keccak
+
+from helpers import hasher
+from helpers.hasher import (BACKENDS, keccak, keccak_many, keccak_pairs,
+                            select_backend)
+
+
+@pytest.mark.parametrize('name', sorted(BACKENDS))
+def test_backends_match_eth_utils(name):
+    '''
+        every backend hashes bytes, bytearray and memoryview inputs like eth_utils
+    '''
+    backend = BACKENDS[name]
+    for data in [b'', os.urandom(1), os.urandom(64), os.urandom(1_000)]:
+        expected = eth_utils_keccak(data)
+        assert backend(data) == expected
+        assert backend(bytearray(data)) == expected
+        assert backend(memoryview(data)) == expected
+
+
+def test_keccak_many():
+    '''
+        keccak_many hashes every item in order
+    '''
+    items = [os.urandom(n) for n in range(0, 100, 7)]
+    assert keccak_many(items) == [eth_utils_keccak(item) for item in items]
+    assert keccak_many(memoryview(item) for item in items) == keccak_many(items)
+    assert keccak_many([]) == []
+
+
+def test_keccak_pairs():
+    '''
+        keccak_pairs hashes the concatenation of the items at the same position of both buffers
+    '''
+    left = os.urandom(32 * 10)
+    right = os.urandom(32 * 10)
+    digests = keccak_pairs(left, right)
+    assert len(digests) == 32 * 10
+    for i in range(0, len(left), 32):
+        assert digests[i: i + 32] == keccak(left[i: i + 32] + right[i: i + 32])
+    assert keccak_pairs(b'', b'') == b''
+
+    with pytest.raises(ValueError):
+        keccak_pairs(left, right[:-32])
+    with pytest.raises(ValueError):
+        keccak_pairs(left[:-1], right[:-1])
+
+
+def test_unavailable_backend():
+    '''
+        forcing a backend that isn't installed raises an ImportError naming the available ones
+    '''
+    selected = hasher.BACKEND
+    with pytest.raises(ImportError) as error:
+        select_backend('no-such-backend')
+    assert all(name in str(error.value) for name in BACKENDS)
+    assert hasher.BACKEND == selected
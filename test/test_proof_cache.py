@@ -0,0 +1,76 @@
+import os
+import random
+
+from helpers.proof_cache import ProofCache
+from helpers.sparse_merkle_tree import SparseMerkleTree
+
+
+def test_cached_proofs_and_counters():
+    '''
+        repeated proof requests are served from the cache
+    '''
+    leaves = {random.getrandbits(64): os.urandom(32) for _ in range(20)}
+    tree = SparseMerkleTree(64, leaves)
+    cache = ProofCache()
+    uid = next(iter(leaves))
+
+    assert cache.proof(tree, uid) == tree.create_merkle_proof(uid)
+    assert cache.proof(tree, uid) == tree.create_merkle_proof(uid)
+    assert cache.stats['hits'] == 1
+    assert cache.stats['misses'] == 1
+
+
+def test_mutated_tree_is_invalidated():
+    '''
+        once the tree changes, proofs are recomputed and the old root's entries dropped
+    '''
+    leaves = {random.getrandbits(64): os.urandom(32) for _ in range(20)}
+    tree = SparseMerkleTree(64, leaves)
+    cache = ProofCache()
+    uid = next(iter(leaves))
+    cache.proof(tree, uid)
+
+    tree.set(random.getrandbits(64), os.urandom(32))
+    assert cache.proof(tree, uid) == tree.create_merkle_proof(uid)
+    assert cache.stats['entries'] == 1
+    assert cache.stats['hits'] == 0
+
+
+def test_eviction_by_size():
+    '''
+        least recently used proofs are evicted once the byte budget is exceeded
+    '''
+    leaves = {random.getrandbits(64): os.urandom(32) for _ in range(20)}
+    tree = SparseMerkleTree(64, leaves)
+    uids = list(leaves)
+    cache = ProofCache(max_bytes=3 * ProofCache.entry_size(tree.root, tree.create_merkle_proof(uids[0])))
+
+    for uid in uids[:3]:
+        cache.proof(tree, uid)
+    cache.proof(tree, uids[0])
+    cache.proof(tree, uids[3])
+
+    assert cache.stats['evictions'] >= 1
+    assert cache.get(tree.root, uids[0]) is not None
+    assert cache.get(tree.root, uids[1]) is None
+    assert cache.stats['bytes'] <= cache.max_bytes
+
+
+def test_proof_of_a_changing_tree_is_not_cached():
+    '''
+        a proof computed while the tree is updated is not cached under the root read before
+    '''
+    class UpdatedWhileProving(SparseMerkleTree):
+        def create_merkle_proof(self, uid):
+            self.set(random.getrandbits(64), os.urandom(32))
+            return super().create_merkle_proof(uid)
+
+    leaves = {random.getrandbits(64): os.urandom(32) for _ in range(20)}
+    tree = UpdatedWhileProving(64, leaves)
+    cache = ProofCache()
+    uid = next(iter(leaves))
+    root = tree.root
+
+    cache.proof(tree, uid)
+    assert cache.get(root, uid) is None
+    assert cache.stats['entries'] == 0
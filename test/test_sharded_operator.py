@@ -0,0 +1,91 @@
+import os
+import random
+
+import pytest
+
+from helpers.admission import ACCEPTED, DUPLICATE_SLOT, NOT_OWNER
+from helpers.sharded_operator import Shard, ShardedOperator
+from helpers.signer import LocalSigner
+from helpers.sparse_merkle_tree import SparseMerkleTree
+from helpers.transaction import PlasmaTransaction
+from helpers.tx_batch import TransactionBatch
+
+
+def test_sharded_block_matches_single_tree():
+    '''
+        the root and proofs combined from the workers are the ones of a single tree of the block
+    '''
+    owner = LocalSigner(os.urandom(32))
+    forger = LocalSigner(os.urandom(32))
+    slots = [random.getrandbits(64) for _ in range(500)]
+    events = [
+        {'event': 'Deposit', 'args': {'slot': slot, 'blockNumber': 1, 'denomination': 20, 'from': owner.address}}
+        for slot in slots
+    ]
+    txs = [PlasmaTransaction(slot, 1, 20, os.urandom(20)) for slot in slots[:200]]
+    txs.append(PlasmaTransaction(slots[0], 1, 20, os.urandom(20)))
+    signers = [owner] * 201
+    signers[5] = forger
+    batch = TransactionBatch.from_transactions(txs, [signer.sign(tx.hash) for signer, tx in zip(signers, txs)])
+
+    with ShardedOperator(workers=3) as operator:
+        operator.ingest_events(events)
+        reasons = operator.admit(batch)
+        assert reasons[5] == NOT_OWNER and reasons[-1] == DUPLICATE_SLOT
+        assert (reasons == ACCEPTED).sum() == 199
+
+        root, throughput = operator.seal(1_000)
+        assert throughput.count == 199
+        included = {tx.slot: tx.hash for tx, reason in zip(txs, reasons) if reason == ACCEPTED}
+        tree = SparseMerkleTree(64, included)
+        assert root == tree.root
+        for slot in list(included)[:10] + [slots[5], random.getrandbits(64)]:
+            assert operator.proof(1_000, slot) == tree.create_merkle_proof(slot)
+
+        # accepted transfers moved the coins to block 1000
+        reasons = operator.admit(TransactionBatch(batch.records[:1]))
+        assert reasons[0] != ACCEPTED
+
+
+def test_worker_errors_leave_the_operator_usable():
+    '''
+        a command failing on several workers leaves no reply behind for the next command
+    '''
+    owner = '0x' + os.urandom(20).hex()
+    slots = [random.getrandbits(64) for _ in range(50)]
+    broken = [{'event': 'Deposit', 'args': {'slot': slot, 'blockNumber': 1, 'denomination': 20}} for slot in slots]
+    events = [
+        {'event': 'Deposit', 'args': {'slot': slot, 'blockNumber': 1, 'denomination': 20, 'from': owner}}
+        for slot in slots
+    ]
+
+    with ShardedOperator(workers=2) as operator:
+        with pytest.raises(KeyError):
+            operator.ingest_events(broken)
+        operator.ingest_events(events)
+        root, throughput = operator.seal(1_000)
+        assert root == SparseMerkleTree(64, {}).root
+        assert throughput.count == 0
+
+
+def test_shard_only_commits_sealed_blocks():
+    '''
+        sealing hashes the pending transfers without applying them, commit does
+    '''
+    owner = '0x' + os.urandom(20).hex()
+    slot = random.getrandbits(60)
+    shard = Shard(64, 60)
+    shard.ingest_events([
+        {'event': 'Deposit', 'args': {'slot': slot, 'blockNumber': 1, 'denomination': 20, 'from': owner}}
+    ])
+    shard.pending[slot] = (os.urandom(32), '0x' + os.urandom(20).hex())
+
+    shard.seal(1_000)
+    assert slot in shard.pending and 1_000 not in shard.blocks
+    assert shard.index.get(slot).last_block == 1
+    with pytest.raises(ValueError):
+        shard.commit(2_000)
+
+    shard.commit(1_000)
+    assert not shard.pending and 1_000 in shard.blocks
+    assert shard.index.get(slot).last_block == 1_000
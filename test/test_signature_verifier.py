@@ -0,0 +1,67 @@
+import os
+import random
+
+from helpers.signature_verifier import SignatureVerifier
+from helpers.signer import LocalSigner
+from helpers.transaction import PlasmaTransaction
+
+
+def test_bulk_verdicts_and_cache():
+    '''
+        valid, forged and malformed signatures get their verdicts, repeated ones come from the cache
+    '''
+    signer = LocalSigner(os.urandom(32))
+    other = LocalSigner(os.urandom(32))
+    txs = [PlasmaTransaction(random.getrandbits(64), 1000, 1, os.urandom(20)) for _ in range(20)]
+    items = [(tx, signer.sign(tx.hash), signer.address) for tx in txs]
+    items.append((txs[0], other.sign(txs[0].hash), signer.address))
+    items.append((txs[1], bytes(signer.sign(txs[1].hash))[:64], signer.address))
+
+    with SignatureVerifier(workers=2, chunk_size=4) as verifier:
+        verdicts, throughput = verifier.verify(items)
+        assert verdicts == [True] * 20 + [False, False]
+        assert throughput.count == len(items)
+        assert verifier.stats['misses'] == len(items)
+
+        verdicts, _ = verifier.verify(items[:5])
+        assert verdicts == [True] * 5
+        assert verifier.stats['hits'] == 5
+
+        extra = PlasmaTransaction(random.getrandbits(64), 1000, 1, os.urandom(20))
+        repeated = (extra, signer.sign(extra.hash), signer.address)
+        verdicts, _ = verifier.verify([repeated, repeated, items[0]])
+        assert verdicts == [True] * 3
+        assert verifier.stats['hits'] == 6
+        assert verifier.stats['misses'] == len(items) + 2
+
+
+def test_cache_is_bounded():
+    '''
+        least recently used signers are evicted past the cache size
+    '''
+    signer = LocalSigner(os.urandom(32))
+    hashes = [os.urandom(32) for _ in range(10)]
+    verifier = SignatureVerifier(workers=1, cache_size=4)
+    verifier.recover_many((message_hash, signer.sign(message_hash)) for message_hash in hashes)
+    assert verifier.stats['entries'] == 4
+
+
+def test_verify_transfers():
+    '''
+        transfers must be signed by the previous owner and stay on the same slot
+    '''
+    alice = LocalSigner(os.urandom(32))
+    bob = LocalSigner(os.urandom(32))
+    slot = random.getrandbits(64)
+    deposit = PlasmaTransaction(slot, 0, 1, alice.address)
+    transfer = PlasmaTransaction(slot, 1, 1, bob.address)
+    other_slot = PlasmaTransaction(slot + 1, 1, 1, bob.address)
+
+    verifier = SignatureVerifier(workers=1)
+    verdicts, _ = verifier.verify_transfers([
+        (None, deposit, alice.sign(deposit.hash)),
+        (deposit, transfer, alice.sign(transfer.hash)),
+        (deposit, transfer, bob.sign(transfer.hash)),
+        (deposit, other_slot, alice.sign(other_slot.hash)),
+    ])
+    assert verdicts == [True, True, False, False]
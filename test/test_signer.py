@@ -0,0 +1,81 @@
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from helpers.signer import (ZERO_ADDRESS, LocalSigner, ecverify, local_signer,
+                            recover, register, sign_batch)
+from helpers.transaction import PlasmaTransaction
+
+
+def test_local_signature_is_eth_sign_signature():
+    '''
+        local signatures are 65 bytes r || s || v with v 27 or 28 and recover to the signer
+    '''
+    signer = LocalSigner(os.urandom(32))
+    tx_hash = os.urandom(32)
+    signature = signer.sign(tx_hash)
+
+    assert len(signature) == 65
+    assert signature[64] in (27, 28)
+    assert recover(tx_hash, signature) == signer.address
+    assert ecverify(tx_hash, signature, signer.address.lower())
+    assert not ecverify(os.urandom(32), signature, signer.address)
+
+
+def test_signature_matches_reference_vector():
+    '''
+        same signature as eth_account signing the hash as a prefixed message, what `w3.eth.sign` returns
+    '''
+    private_key = bytes.fromhex('4c0883a69102937d6231471b5dbb6204fe5129617082792ae468d01a3f362318')
+    message_hash = bytes.fromhex('aafa37befee2add73d624b23431a7bdfa6fc0599ff7274336fa15f948a4599c1')
+    expected = bytes.fromhex(
+        '07bab3c172c933a9a12147bea4127e60a6fcf628c96329e8b6b3309648181838'
+        '28c155e8f91dcdecbe837af4060eece0526d85e4854834c08bb38ff5342f218d'
+        '1b'
+    )
+    signer = LocalSigner(private_key)
+
+    assert signer.address == '0x2c7536E3605D9C16a7a3D7b1898e529396a65c23'
+    assert bytes(signer.sign(message_hash)) == expected
+    assert recover(message_hash, expected) == signer.address
+
+
+def test_malformed_signatures_recover_to_zero_address():
+    '''
+        like ECDSA.recover, bad lengths and versions give the zero address
+    '''
+    signer = LocalSigner(os.urandom(32))
+    tx_hash = os.urandom(32)
+    signature = bytes(signer.sign(tx_hash))
+
+    assert recover(tx_hash, signature[:64]) == ZERO_ADDRESS
+    assert recover(tx_hash, signature[:64] + bytes([29])) == ZERO_ADDRESS
+    assert recover(tx_hash, signature[:64] + bytes([signature[64] - 27])) == signer.address
+
+
+def test_keyring():
+    '''
+        registered keys are found by address whatever the case
+    '''
+    signer = register(os.urandom(32))
+    assert local_signer(signer.address.upper().replace('0X', '0x')) is signer
+    assert local_signer('0x' + os.urandom(20).hex()) is None
+
+
+def test_sign_batch_matches_single_signatures():
+    '''
+        batch signing on a process pool returns the single signatures in order
+    '''
+    keys = [os.urandom(32) for _ in range(3)]
+    txs = [PlasmaTransaction(random.getrandbits(64), 1000, 1, os.urandom(20)) for _ in range(60)]
+    tx_keys = [keys[i % 3] for i in range(len(txs))]
+
+    signatures, throughput = sign_batch(txs, tx_keys, workers=2, chunk_size=7)
+    assert throughput.count == len(txs)
+    for tx, key, signature in zip(txs, tx_keys, signatures):
+        assert signature == LocalSigner(key).sign(tx.hash)
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        for start in (0, 30):
+            batch, _ = sign_batch(txs[start: start + 30], tx_keys[start: start + 30], chunk_size=7, executor=executor)
+            assert batch == signatures[start: start + 30]
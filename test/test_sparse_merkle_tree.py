@@ -0,0 +1,349 @@
+import os
+import random
+
+import pytest
+
+from helpers import sparse_merkle_tree
+from helpers.compressed_sparse_merkle_tree import CompressedSparseMerkleTree
+from helpers.sparse_merkle_tree import (SparseMerkleTree, verify_multiproof,
+                                        verify_proofs)
+from helpers.streaming_root import stream_root
+from helpers.versioned_sparse_merkle_tree import VersionedSparseMerkleTree
+
+
+def random_leaves(count):
+    '''
+        random uid -> leaf hash mapping to build trees from
+    '''
+    return {random.getrandbits(64): os.urandom(32) for _ in range(count)}
+
+
+def test_set_matches_rebuild():
+    '''
+        setting leaves one by one gives the same root and proofs as building from scratch
+    '''
+    leaves = random_leaves(50)
+    tree = SparseMerkleTree(64)
+    for uid, leaf_hash in leaves.items():
+        root = tree.set(uid, leaf_hash)
+
+    rebuilt = SparseMerkleTree(64, leaves)
+    assert root == rebuilt.root == tree.root
+    for uid in leaves:
+        assert tree.create_merkle_proof(uid) == rebuilt.create_merkle_proof(uid)
+
+
+def test_update_and_delete_match_rebuild():
+    '''
+        a batched update, including deletions, gives the same root as a rebuild
+    '''
+    leaves = random_leaves(50)
+    tree = SparseMerkleTree(64, leaves)
+    removed = list(leaves)[:10]
+    changed = list(leaves)[10:20]
+
+    changes = {uid: None for uid in removed}
+    changes.update({uid: os.urandom(32) for uid in changed})
+    changes.update(random_leaves(5))
+    tree.update(changes)
+
+    for uid, leaf_hash in changes.items():
+        if leaf_hash is None:
+            del leaves[uid]
+        else:
+            leaves[uid] = leaf_hash
+    rebuilt = SparseMerkleTree(64, leaves)
+    assert tree.root == rebuilt.root
+    assert tree.verify(changed[0], tree.create_merkle_proof(changed[0]))
+
+
+def test_mixed_changes_through_level_overlays(monkeypatch):
+    '''
+        single and batched inserts, overwrites and deletes, with snapshots and overlay merges in between, match a rebuild
+    '''
+    monkeypatch.setattr(sparse_merkle_tree, 'OVERLAY_MIN', 8)
+    leaves = random_leaves(300)
+    tree = SparseMerkleTree(64, leaves)
+    snapshots = []
+    for step in range(60):
+        uids = list(leaves)
+        if step % 3 == 0:
+            changes = {random.choice(uids): os.urandom(32)}
+        elif step % 3 == 1:
+            changes = {random.choice(uids): None, random.getrandbits(64): os.urandom(32)}
+        else:
+            changes = random_leaves(20)
+            changes.update({uid: None for uid in random.sample(uids, 10)})
+            changes.update({uid: os.urandom(32) for uid in random.sample(uids, 10)})
+        tree.update(changes)
+        for uid, leaf_hash in changes.items():
+            if leaf_hash is None:
+                leaves.pop(uid, None)
+            else:
+                leaves[uid] = leaf_hash
+        if step % 10 == 0:
+            snapshots.append((tree.snapshot(), dict(leaves)))
+
+    rebuilt = SparseMerkleTree(64, leaves)
+    assert tree.root == rebuilt.root
+    assert len(tree.leaves) == len(leaves) and dict(tree.leaves.items()) == leaves
+    for uid in random.sample(list(leaves), 20) + [random.getrandbits(64)]:
+        assert tree.create_merkle_proof(uid) == rebuilt.create_merkle_proof(uid)
+    for snapshot, snapshot_leaves in snapshots:
+        assert snapshot.root == SparseMerkleTree(64, snapshot_leaves).root
+        assert len(snapshot.leaves) == len(snapshot_leaves)
+
+
+def test_delete_all_leaves():
+    '''
+        deleting every leaf brings the tree back to the empty root
+    '''
+    leaves = random_leaves(5)
+    tree = SparseMerkleTree(64, leaves)
+    for uid in leaves:
+        tree.delete(uid)
+    assert tree.root == SparseMerkleTree(64).root
+
+
+def test_compressed_tree_matches_full_tree():
+    '''
+        compressed storage gives the same root and proofs, for included and missing slots
+    '''
+    leaves = random_leaves(100)
+    tree = SparseMerkleTree(64, leaves)
+    compressed = CompressedSparseMerkleTree(64, leaves)
+    assert compressed.root == tree.root
+
+    uids = list(leaves)[:20] + [random.getrandbits(64) for _ in range(20)]
+    for uid in uids:
+        proof = compressed.create_merkle_proof(uid)
+        assert proof == tree.create_merkle_proof(uid)
+        assert compressed.verify(uid, proof) == tree.verify(uid, proof)
+
+
+def test_compressed_tree_update():
+    '''
+        incremental updates on the compressed tree track a rebuilt full tree
+    '''
+    leaves = random_leaves(50)
+    compressed = CompressedSparseMerkleTree(64, leaves)
+    changes = {uid: None for uid in list(leaves)[:10]}
+    changes.update(random_leaves(10))
+    compressed.update(changes)
+
+    tree = SparseMerkleTree(64, leaves)
+    tree.update(changes)
+    assert compressed.root == tree.root
+    assert dict(compressed.leaves) == dict(tree.leaves)
+
+
+def test_build_parallel_matches_serial_build():
+    '''
+        a tree built on a process pool has the same levels, root and proofs
+    '''
+    leaves = random_leaves(500)
+    tree = SparseMerkleTree(64, leaves)
+    parallel = SparseMerkleTree.build_parallel(leaves, workers=2)
+
+    assert parallel.root == tree.root
+    assert [len(level) for level in parallel.tree] == [len(level) for level in tree.tree]
+    for uid in list(leaves)[:20]:
+        assert parallel.create_merkle_proof(uid) == tree.create_merkle_proof(uid)
+
+
+def test_stream_root_matches_tree_root():
+    '''
+        the streaming builder gives the tree root, for sorted input and through the external sort
+    '''
+    leaves = random_leaves(300)
+    root = SparseMerkleTree(64, leaves).root
+    assert stream_root(sorted(leaves.items())) == root
+
+    shuffled = list(leaves.items())
+    random.shuffle(shuffled)
+    assert stream_root(shuffled, presorted=False, run_size=64) == root
+    assert stream_root([]) == SparseMerkleTree(64).root
+
+    shuffled[5] = (shuffled[5][0], shuffled[5][1][:31])
+    with pytest.raises(ValueError):
+        stream_root(shuffled, presorted=False, run_size=64)
+
+
+def test_create_merkle_proofs_matches_single_proofs():
+    '''
+        batched proofs, for every leaf or for chosen slots, are the single proofs
+    '''
+    leaves = random_leaves(200)
+    tree = SparseMerkleTree(64, leaves)
+
+    proofs = tree.create_merkle_proofs()
+    assert len(proofs) == len(leaves)
+    for uid in leaves:
+        assert proofs[uid] == tree.create_merkle_proof(uid)
+
+    uids = list(leaves)[:5] + [random.getrandbits(64) for _ in range(5)]
+    proofs = tree.create_merkle_proofs(uids)
+    for uid in uids:
+        assert proofs[uid] == tree.create_merkle_proof(uid)
+
+
+def test_verify_proofs_without_tree():
+    '''
+        proofs are checked against a bare root, memoized paths still reject tampered proofs
+    '''
+    leaves = random_leaves(100)
+    tree = SparseMerkleTree(64, leaves)
+    proofs = tree.create_merkle_proofs()
+    items = [(uid, leaves[uid], proofs[uid]) for uid in leaves]
+
+    memo = {}
+    results, throughput = verify_proofs(tree.root, items, memo=memo)
+    assert all(results)
+    assert throughput.count == len(items)
+
+    uid = next(iter(leaves))
+    tampered = proofs[uid][:-32] + os.urandom(32)
+    results, _ = verify_proofs(tree.root, [(uid, leaves[uid], tampered), (uid, os.urandom(32), proofs[uid])], memo=memo)
+    assert results == [False, False]
+
+    # a memo filled against one root proves nothing against another
+    results, _ = verify_proofs(os.urandom(32), items[:3], memo=memo)
+    assert results == [False, False, False]
+    assert verify_proofs(tree.root, items[:3], memo=memo)[0] == [True, True, True]
+
+
+def test_multiproof():
+    '''
+        one multiproof covers many slots, is smaller than their single proofs and rebuilds the root
+    '''
+    leaves = random_leaves(200)
+    tree = SparseMerkleTree(64, leaves)
+    uids = list(leaves)[:30]
+
+    multiproof = tree.create_multiproof(uids)
+    assert len(multiproof) < sum(len(tree.create_merkle_proof(uid)) for uid in uids)
+    assert verify_multiproof(tree.root, {uid: leaves[uid] for uid in uids}, multiproof)
+    assert tree.verify_multiproof(uids, multiproof)
+
+    forged = {uid: leaves[uid] for uid in uids}
+    forged[uids[0]] = os.urandom(32)
+    assert not verify_multiproof(tree.root, forged, multiproof)
+
+
+def test_versioned_tree_keeps_every_block():
+    '''
+        roots and proofs of older blocks stay available after later blocks are committed
+    '''
+    versioned = VersionedSparseMerkleTree(64)
+    leaves = {}
+    history = {}
+    for block_number in range(1_000, 6_000, 1_000):
+        changes = {uid: None for uid in list(leaves)[:3]}
+        changes.update(random_leaves(10))
+        versioned.commit(block_number, changes)
+        for uid, leaf_hash in changes.items():
+            if leaf_hash is None:
+                del leaves[uid]
+            else:
+                leaves[uid] = leaf_hash
+        history[block_number] = dict(leaves)
+
+    for block_number, block_leaves in history.items():
+        tree = SparseMerkleTree(64, block_leaves)
+        assert versioned.root_at(block_number) == tree.root
+        uid = next(iter(block_leaves))
+        assert versioned.proof_at(block_number, uid) == tree.create_merkle_proof(uid)
+
+
+def test_exclusion_proofs_over_block_range():
+    '''
+        exclusion proofs across blocks match per block proofs, are deduplicated and skip blocks including the slot
+    '''
+    versioned = VersionedSparseMerkleTree(64)
+    leaves = random_leaves(50)
+    slot = random.getrandbits(64)
+    history = {}
+    for block_number in range(1_000, 11_000, 1_000):
+        if block_number == 5_000:
+            changes = {slot: os.urandom(32)}
+        elif block_number == 6_000:
+            changes = {slot: None}
+        elif block_number % 3_000 == 0:
+            changes = random_leaves(2)
+        else:
+            changes = {}
+        leaves.update(changes)
+        versioned.commit(block_number, changes if block_number != 1_000 else leaves)
+        history[block_number] = SparseMerkleTree(64, {uid: h for uid, h in leaves.items() if h is not None})
+
+    proofs = versioned.exclusion_proofs([slot], 1_000, 10_000)
+    for block_number, tree in history.items():
+        if block_number == 5_000:
+            assert proofs.proof(slot, block_number) is None
+        else:
+            assert proofs.proof(slot, block_number) == tree.create_merkle_proof(slot)
+    assert len(proofs) < len(history) - 1
+    assert len(proofs.proofs) == len(set(proofs.proofs))
+    # blocks inside a run that were never committed have no proof
+    assert proofs.proof(slot, 1_500) is None
+    assert proofs.proof(slot, 1_001) is None
+    assert proofs.proof(slot, 11_000) is None
+
+
+def test_save_and_load_snapshot(tmpdir):
+    '''
+        a mapped snapshot serves the same root and proofs and can still be updated
+    '''
+    leaves = random_leaves(100)
+    tree = SparseMerkleTree(64, leaves)
+    path = str(tmpdir.join('tree.smt'))
+    tree.save(path)
+
+    loaded = SparseMerkleTree.load(path)
+    assert loaded.root == tree.root
+    for uid in list(leaves)[:10]:
+        assert loaded.create_merkle_proof(uid) == tree.create_merkle_proof(uid)
+
+    changes = random_leaves(3)
+    assert loaded.update(changes) == tree.update(changes)
+
+
+def test_snapshot_is_not_affected_by_updates():
+    '''
+        a snapshot keeps serving the root and proofs it was taken with while the tree changes
+    '''
+    leaves = random_leaves(100)
+    tree = SparseMerkleTree(64, leaves)
+    snapshot = tree.snapshot()
+    uids = list(leaves)
+    proofs = {uid: snapshot.create_merkle_proof(uid) for uid in uids[:10]}
+
+    changes = {uids[0]: os.urandom(32), uids[1]: None}
+    changes.update(random_leaves(5))
+    tree.update(changes)
+
+    assert snapshot.root == SparseMerkleTree(64, leaves).root != tree.root
+    assert snapshot.leaves[uids[0]] == leaves[uids[0]]
+    for uid, proof in proofs.items():
+        assert snapshot.create_merkle_proof(uid) == proof
+
+    with pytest.raises(SparseMerkleTree.ReadOnlyTreeException):
+        snapshot.set(uids[0], os.urandom(32))
+
+
+def test_diff_between_trees():
+    '''
+        diff lists exactly the added, removed and changed slots
+    '''
+    leaves = random_leaves(200)
+    tree = SparseMerkleTree(64, leaves)
+    uids = list(leaves)
+    changes = {uids[0]: None, uids[1]: os.urandom(32)}
+    changes.update(random_leaves(3))
+    other = SparseMerkleTree(64, leaves)
+    other.update(changes)
+
+    assert tree.diff(other) == sorted(changes)
+    assert other.diff(tree) == sorted(changes)
+    assert tree.diff(SparseMerkleTree(64, leaves)) == []
+    assert SparseMerkleTree(64).diff(tree) == sorted(leaves)
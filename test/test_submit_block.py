@@ -1,5 +1,6 @@
 import pytest
 
+from helpers.block_submitter import BlockSubmitter
 from helpers.const import DEFAULT_PASSWORD
 from helpers.const import W3 as w3
 
@@ -64,3 +65,27 @@ def test_unauthorized_user_submition(setup):
         w3.personal.unlockAccount(alice_addr, DEFAULT_PASSWORD)
         tx_hash = fn_submit.transact(kwargs)
         assert w3.eth.waitForTransactionReceipt(tx_hash).status
+
+
+def test_pipelined_block_submission(setup):
+    '''
+        several blocks in flight at once all reach childChain with their roots
+    '''
+    _, deployed_contracts = setup
+    plasma_instance = deployed_contracts.plasma_instance
+    submitter = BlockSubmitter(w3, plasma_instance, w3.eth.accounts[0], max_in_flight=3, poll_interval=0.1)
+
+    current_block = plasma_instance.functions.currentBlock().call()
+    block_numbers = [(current_block // 1_000 + i) * 1_000 for i in range(1, 7)]
+    roots = {block_number: w3.soliditySha3(['uint256'], [block_number]) for block_number in block_numbers}
+    for block_number in block_numbers:
+        submitter.submit(block_number, roots[block_number])
+
+    confirmed = submitter.flush(timeout=120)
+    submitter.close()
+    assert [block_number for block_number, _ in confirmed] == block_numbers
+    for block_number in block_numbers:
+        assert plasma_instance.functions.childChain(block_number).call()[0] == roots[block_number]
+
+    with pytest.raises(BlockSubmitter.BlockOrderException):
+        submitter.submit(block_numbers[0], roots[block_numbers[0]])
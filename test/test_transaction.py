@@ -0,0 +1,49 @@
+import os
+import random
+
+import pytest
+import rlp
+
+from helpers.hasher import keccak
+from helpers.transaction import PlasmaTransaction
+
+
+def test_encoding_matches_rlp():
+    '''
+        the encoding is the rlp library's, and decoding gives back the same transaction
+    '''
+    owner = os.urandom(20)
+    for prev_block in (0, 5, 1000, 2 ** 200):
+        tx = PlasmaTransaction(random.getrandbits(64), prev_block, 5000 * 10 ** 18, owner)
+        tx_bytes = tx.to_bytes()
+        assert tx_bytes == rlp.encode([tx.slot, prev_block, tx.denomination, owner])
+
+        decoded = PlasmaTransaction.from_bytes(tx_bytes)
+        assert decoded == tx
+        assert decoded.to_bytes() is tx_bytes
+
+
+def test_hash_follows_transaction_sol():
+    '''
+        deposits hash the uint64 slot, transfers hash the encoded bytes
+    '''
+    slot = random.getrandbits(64)
+    owner = '0x' + os.urandom(20).hex()
+    deposit = PlasmaTransaction(slot, 0, 1, owner)
+    transfer = PlasmaTransaction(slot, 1000, 1, owner)
+
+    assert deposit.hash == keccak(slot.to_bytes(8, byteorder='big'))
+    assert transfer.hash == keccak(transfer.to_bytes())
+
+
+def test_immutable_and_malformed():
+    '''
+        transactions can't be modified and bad encodings are rejected
+    '''
+    tx = PlasmaTransaction(1, 2, 3, os.urandom(20))
+    with pytest.raises(AttributeError):
+        tx.slot = 2
+
+    for tx_bytes in (b'', rlp.encode([1, 2, 3]), rlp.encode([1, 2, 3, os.urandom(19)]), tx.to_bytes()[:-1]):
+        with pytest.raises(PlasmaTransaction.InvalidTransactionException):
+            PlasmaTransaction.from_bytes(tx_bytes)
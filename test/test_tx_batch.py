@@ -0,0 +1,88 @@
+import os
+import random
+
+import pytest
+import rlp
+
+from helpers.transaction import PlasmaTransaction
+from helpers.tx_batch import TransactionBatch
+
+
+def random_transactions(count):
+    '''
+        transactions with deposits, small and large integers to cover every RLP length case
+    '''
+    return [
+        PlasmaTransaction(
+            random.choice([0, 1, 127, 128, random.getrandbits(64)]),
+            random.choice([0, 1, 1000, random.getrandbits(64)]),
+            random.choice([0, 20, 5000 * 10 ** 18, random.getrandbits(256)]),
+            os.urandom(20),
+        )
+        for _ in range(count)
+    ]
+
+
+def test_encode_matches_rlp_and_round_trips():
+    '''
+        vectorized encoding is the rlp library's, and decoding gives back the transactions
+    '''
+    txs = random_transactions(300)
+    signatures = [os.urandom(65) for _ in txs]
+    batch = TransactionBatch.from_transactions(txs, signatures)
+
+    encoded = batch.to_rlp()
+    assert encoded == [rlp.encode([tx.slot, tx.prev_block, tx.denomination, tx.owner]) for tx in txs]
+    assert batch.hashes() == [tx.hash for tx in txs]
+
+    decoded = TransactionBatch.from_rlp(encoded, signatures)
+    assert decoded.transactions() == txs
+    assert decoded.signatures() == signatures
+
+
+def test_decode_rejects_malformed_transactions():
+    '''
+        the positions of the transactions that can't be decoded are reported
+    '''
+    txs = random_transactions(5)
+    encoded = [tx.to_bytes() for tx in txs]
+    encoded[1] = encoded[1][:-1]
+    encoded[3] = rlp.encode([1, 2, 3])
+    with pytest.raises(PlasmaTransaction.InvalidTransactionException, match=r'\[1, 3\]'):
+        TransactionBatch.from_rlp(encoded)
+    with pytest.raises(PlasmaTransaction.InvalidTransactionException, match=r'\[0\]'):
+        TransactionBatch.from_rlp([b''])
+    with pytest.raises(PlasmaTransaction.InvalidTransactionException, match=r'\[0, 1\]'):
+        TransactionBatch.from_rlp([b'', b''])
+    assert len(TransactionBatch.from_rlp([])) == 0
+
+
+def test_out_of_range_fields_are_rejected():
+    '''
+        a slot or prevBlock past 64 bits or a denomination past 256 bits can't be batched
+    '''
+    owner = os.urandom(20)
+    for tx, field in [
+        (PlasmaTransaction(2 ** 64, 1, 1, owner), 'slot'),
+        (PlasmaTransaction(1, 2 ** 64, 1, owner), 'prevBlock'),
+        (PlasmaTransaction(1, 1, 2 ** 256, owner), 'denomination'),
+        (PlasmaTransaction(-1, 1, 1, owner), 'slot'),
+    ]:
+        with pytest.raises(PlasmaTransaction.InvalidTransactionException, match=field):
+            TransactionBatch.from_transactions([PlasmaTransaction(1, 1, 1, owner), tx])
+
+
+def test_save_and_load_batch(tmpdir):
+    '''
+        a mapped batch file gives back the same transactions and signatures
+    '''
+    txs = random_transactions(50)
+    signatures = [os.urandom(65) for _ in txs]
+    batch = TransactionBatch.from_transactions(txs, signatures)
+    path = str(tmpdir.join('txs.batch'))
+    batch.save(path)
+
+    loaded = TransactionBatch.load(path)
+    assert loaded.transactions() == txs
+    assert loaded.signatures() == signatures
+    assert TransactionBatch.from_bytes(batch.to_bytes()).to_rlp() == batch.to_rlp()